@@ -1,16 +1,169 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import psycopg2
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+import asyncio
+import base64
+import json
+import logging
+import math
 import os
+import secrets
 from dotenv import load_dotenv
 import time
 import re
-import difflib
 
 load_dotenv()
 
-app = FastAPI(title="PharmaVerse API", version="1.0.0")
+import metrics
+from db import StreamLimitReached, create_database, phase_times, query_time, record_phase
+from queries import fulltext_query, prefix_query, substring_query
+from result_cache import create_cache, encode_results
+from search_index import (FUZZY_FALLBACK_THRESHOLD, SearchIndexes, calculate_similarity, load_catalog,
+                          load_changes, normalize_name, prefix_key)
+
+logger = logging.getLogger("pharmaverse")
+
+db = create_database()
+result_cache = create_cache()
+
+# Default pg_trgm similarity cut-off for /search/fuzzy (overridable per request)
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_SIMILARITY_THRESHOLD", 0.3))
+
+# Set at startup, or by the first fuzzy search or watcher poll once the
+# database answers (None until then); when pg_trgm is missing fuzzy search
+# falls back to difflib scoring
+trgm_available = None
+
+async def detect_trgm() -> bool:
+    row = await db.fetch_one("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    return row is not None
+
+async def trgm_ready() -> bool:
+    """Whether pg_trgm is installed, detecting it now if startup could not"""
+    global trgm_available
+    if trgm_available is None:
+        trgm_available = await detect_trgm()
+    return trgm_available
+
+# Search engine per endpoint: "sql" queries Postgres, "memory" answers from an
+# in-process index that is rebuilt whenever the dataset version changes
+PREFIX_ENGINE = os.getenv("PREFIX_ENGINE", "sql").lower()
+SUBSTRING_ENGINE = os.getenv("SUBSTRING_ENGINE", "sql").lower()
+# Fuzzy: "sql" (pg_trgm, difflib fallback) or "symspell" (in-memory typo correction)
+FUZZY_ENGINE = os.getenv("FUZZY_ENGINE", "sql").lower()
+FUZZY_MAX_EDIT_DISTANCE = int(os.getenv("FUZZY_MAX_EDIT_DISTANCE", 2))
+FUZZY_SYMSPELL_PREFIX_LENGTH = int(os.getenv("FUZZY_SYMSPELL_PREFIX_LENGTH", 7))
+
+# Largest page a client may ask for with ?limit=
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", 1000))
+
+# GET /search fans out to these engines, giving each this many milliseconds,
+# and fuses their rankings with reciprocal-rank fusion (k=60)
+HYBRID_ENGINES = ("prefix", "fulltext", "fuzzy")
+HYBRID_ENGINE_TIMEOUT_MS = float(os.getenv("HYBRID_ENGINE_TIMEOUT_MS", 500))
+RRF_K = 60
+# Executions per engine that may keep running after missing the hybrid budget;
+# past it the engine only answers hybrid calls from the cache or a running query
+HYBRID_MAX_DETACHED = int(os.getenv("HYBRID_MAX_DETACHED", 2))
+
+# Most queries accepted by one POST /search/batch
+SEARCH_BATCH_MAX_ITEMS = int(os.getenv("SEARCH_BATCH_MAX_ITEMS", 100))
+
+# Rows fetched per round trip when streaming format=ndjson responses
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+
+# Seconds between dataset_version polls
+DATASET_POLL_INTERVAL = float(os.getenv("DATASET_POLL_INTERVAL", 30))
+
+# Last dataset version seen, and the in-memory indexes (None until first built)
+dataset_version = None
+indexes = None
+
+# Live medicines, recounted by the watcher only when the dataset version
+# changes, so health probes never scan the table (None until first counted)
+medicines_count = None
+
+# Token the /admin routes require in the X-Admin-Token header; unset hides them (404)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Seconds GET /health/ready waits for SELECT 1 before reporting not ready
+HEALTH_READY_TIMEOUT = float(os.getenv("HEALTH_READY_TIMEOUT", 2))
+# GET /health/details recomputes its statistics at most once per this many seconds
+HEALTH_DETAILS_MIN_INTERVAL = float(os.getenv("HEALTH_DETAILS_MIN_INTERVAL", 10))
+
+def memory_engines_enabled() -> bool:
+    return "memory" in (PREFIX_ENGINE, SUBSTRING_ENGINE) or FUZZY_ENGINE == "symspell"
+
+def build_indexes(conn) -> SearchIndexes:
+    return SearchIndexes(load_catalog(conn),
+                         prefix=PREFIX_ENGINE == "memory",
+                         substring=SUBSTRING_ENGINE == "memory",
+                         fuzzy=FUZZY_ENGINE == "symspell",
+                         fuzzy_max_distance=FUZZY_MAX_EDIT_DISTANCE,
+                         fuzzy_prefix_length=FUZZY_SYMSPELL_PREFIX_LENGTH)
+
+def update_indexes(conn, current: SearchIndexes) -> SearchIndexes:
+    """Apply the rows changed since ``current`` was built; full rebuild after a full reload"""
+    changes = load_changes(conn, current.version)
+    if changes is None:
+        return build_indexes(conn)
+    version, changed_ids, records = changes
+    logger.info("Applying %d changed rows (dataset version %s -> %s)", len(changed_ids), current.version, version)
+    return current.with_changes(changed_ids, records, version)
+
+async def watch_dataset_version():
+    """Poll dataset_version and rebuild the in-memory indexes after a reimport"""
+    global dataset_version, indexes, medicines_count
+    while True:
+        try:
+            await trgm_ready()
+            row = await db.fetch_one("SELECT version FROM dataset_version")
+            version = row[0] if row else 0
+            if version != dataset_version:
+                if result_cache is not None and dataset_version is not None:
+                    await result_cache.clear()
+                if memory_engines_enabled():
+                    started = time.time()
+                    if indexes is None:
+                        indexes = await db.run(build_indexes)
+                    else:
+                        indexes = await db.run(update_indexes, indexes)
+                    logger.info("Built in-memory indexes for dataset version %s (%d rows) in %.2fs",
+                                indexes.version, len(indexes.catalog), time.time() - started)
+                row = await db.fetch_one("SELECT COUNT(*) FROM medicines WHERE deleted_at IS NULL")
+                medicines_count = row[0]
+                dataset_version = version
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Dataset version check failed")
+        await asyncio.sleep(DATASET_POLL_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global trgm_available
+    # Starts even when Postgres is down: /health/ready reports the outage and
+    # the watcher retries the detection below until the database answers
+    db.open()
+    try:
+        trgm_available = await detect_trgm()
+    except Exception:
+        logger.warning("Database unavailable at startup; pg_trgm detection deferred")
+    watcher = asyncio.create_task(watch_dataset_version())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        try:
+            await watcher
+        except asyncio.CancelledError:
+            pass
+        db.close()
+
+app = FastAPI(title="PharmaVerse API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,15 +172,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-def get_db_connection():
-    return psycopg2.connect(
-        dbname=os.getenv("DB_NAME", "medicine_search"),
-        user=os.getenv("DB_USER", "postgres"),
-        password=os.getenv("DB_PASSWORD", "Dadapeer"),
-        host=os.getenv("DB_HOST", "localhost"),
-        port=os.getenv("DB_PORT", "5432")
-    )
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -414,6 +559,7 @@ async def root():
                 </button>
             </div>
             <div class="search-types">
+                <button class="search-btn" id="hybrid-btn" onclick="setSearchType('hybrid')">✨ Smart Search</button>
                 <button class="search-btn active" id="prefix-btn" onclick="setSearchType('prefix')">🎯 Prefix Search</button>
                 <button class="search-btn" id="substring-btn" onclick="setSearchType('substring')">🔍 Substring Search</button>
                 <button class="search-btn" id="fulltext-btn" onclick="setSearchType('fulltext')">🧠 Full-text Search</button>
@@ -487,7 +633,8 @@ async def root():
             `;
             
             try {
-                const response = await fetch(`/search/${currentSearchType}?q=${encodeURIComponent(query)}`);
+                const endpoint = currentSearchType === 'hybrid' ? '/search' : `/search/${currentSearchType}`;
+                const response = await fetch(`${endpoint}?q=${encodeURIComponent(query)}`);
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
@@ -496,6 +643,7 @@ async def root():
                 const resultsDiv = document.getElementById('results');
                 if (data.results && data.results.length > 0) {
                     const searchTypeNames = {
+                        'hybrid': '✨ Smart Search',
                         'prefix': '🎯 Prefix Search',
                         'substring': '🔍 Substring Search', 
                         'fulltext': '🧠 Full-text Search',
@@ -593,185 +741,795 @@ async def root():
 </body>
 </html>"""
 
+async def estimated_medicines_count() -> int:
+    """Planner row estimate for medicines, used until the watcher has counted"""
+    row = await db.fetch_one("SELECT reltuples::bigint FROM pg_class WHERE oid = 'medicines'::regclass")
+    # reltuples is -1 for a table that has never been vacuumed or analyzed
+    return max(row[0], 0) if row else 0
+
 @app.get("/health")
 async def health_check():
+    """Backward-compatible status: a trivial query plus the cached medicines count"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM medicines")
-        count = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
+        await asyncio.wait_for(db.fetch_one("SELECT 1"), HEALTH_READY_TIMEOUT)
+        count = medicines_count
+        if count is None:
+            count = await estimated_medicines_count()
         return {"status": "healthy", "medicines_count": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
 
-@app.get("/search/prefix")
-async def search_prefix(q: str = Query(..., min_length=1, max_length=100)):
-    start_time = time.time()
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is serving requests. Never touches the database."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: a pooled connection answers SELECT 1 within HEALTH_READY_TIMEOUT"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        await asyncio.wait_for(db.fetch_one("SELECT 1"), HEALTH_READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail=f"Database did not answer within {HEALTH_READY_TIMEOUT}s")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
+    return {"status": "ready", "dataset_version": dataset_version}
+
+# Last /health/details response and when it was computed (monotonic seconds)
+health_details_snapshot = None
+health_details_at = 0.0
+health_details_lock = asyncio.Lock()
+
+def table_stats(conn) -> dict:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM medicines WHERE deleted_at IS NULL")
+        live = cursor.fetchone()[0]
         cursor.execute("""
-            SELECT name, manufacturer_name, type, price, pack_size_label, short_composition
-            FROM medicines
-            WHERE name ILIKE %s || '%%'
-            ORDER BY name
-            LIMIT 100
-        """, (q,))
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                "name": row[0],
-                "manufacturer_name": row[1],
-                "type": row[2],
-                "price": row[3],
-                "pack_size_label": row[4],
-                "short_composition": row[5]
-            })
-        cursor.close()
-        conn.close()
-        execution_time = time.time() - start_time
-        return {
-            "query": q,
-            "type": "prefix",
-            "results": results,
-            "count": len(results),
-            "execution_time_ms": round(execution_time * 1000, 2)
-        }
+            SELECT c.reltuples::bigint, pg_total_relation_size(c.oid),
+                   s.n_live_tup, s.n_dead_tup, s.last_autovacuum, s.last_autoanalyze
+            FROM pg_class c
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE c.oid = 'medicines'::regclass
+        """)
+        reltuples, total_bytes, n_live, n_dead, last_vacuum, last_analyze = cursor.fetchone()
+    return {
+        "medicines_count": live,
+        "estimated_rows": reltuples,
+        "total_bytes": total_bytes,
+        "live_tuples": n_live,
+        "dead_tuples": n_dead,
+        "last_autovacuum": last_vacuum.isoformat() if last_vacuum else None,
+        "last_autoanalyze": last_analyze.isoformat() if last_analyze else None,
+    }
+
+@app.get("/health/details")
+async def health_details():
+    """Exact counts and table statistics, recomputed at most once per HEALTH_DETAILS_MIN_INTERVAL.
+
+    Calls in between get the previous snapshot, so polling this endpoint
+    cannot turn into a stream of table scans.
+    """
+    global health_details_snapshot, health_details_at
+    async with health_details_lock:
+        age = time.monotonic() - health_details_at
+        if health_details_snapshot is None or age >= HEALTH_DETAILS_MIN_INTERVAL:
+            try:
+                table = await db.run(table_stats)
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
+            health_details_snapshot = {
+                "dataset_version": dataset_version,
+                "table": table,
+                "indexes": None if indexes is None else {"version": indexes.version, "rows": len(indexes.catalog)},
+                "trgm_available": trgm_available,
+            }
+            health_details_at = time.monotonic()
+            age = 0.0
+        return {**health_details_snapshot, "age_s": round(age, 3),
+                "max_age_s": HEALTH_DETAILS_MIN_INTERVAL}
+
+@app.get("/health/pool")
+async def pool_stats():
+    """Connection pool statistics (in use, idle, waiters, checkout wait time, open streams).
+
+    Under load calls queue for a database thread before they reach the pool,
+    so ``executor`` shows that queue's depth and wait time.
+    """
+    return {**db.pool.stats(), "executor": db.executor_stats(), "streams": db.stream_stats()}
+
+def medicine_result(row, **extra) -> dict:
+    """Response dict for a (sku_id, name, manufacturer_name, type, price, pack_size_label, short_composition, ...) row"""
+    result = {
+        "sku_id": row[0],
+        "name": row[1],
+        "manufacturer_name": row[2],
+        "type": row[3],
+        "price": row[4],
+        "pack_size_label": row[5],
+        "short_composition": row[6]
+    }
+    result.update(extra)
+    return result
+
+def keyset_page(rows: list, limit: int, sort_key) -> tuple:
+    """Trim ``limit + 1`` fetched rows to one page and the sort key to resume after it"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, sort_key(rows[-1])
+    return rows, None
+
+def catalog_key(position: int, rank=None) -> tuple:
+    """Keyset sort key (rank, name_key, id) of an in-memory catalog position"""
+    return (rank, indexes.catalog.keys[position], indexes.catalog.rows[position][0])
+
+async def prefix_search(q: str, limit: int = 100, after: tuple = None) -> tuple:
+    if indexes is not None and indexes.prefix is not None:
+        catalog = indexes.catalog
+        start = catalog.position_after(after[1], after[2]) if after else 0
+        positions, next_key = keyset_page(indexes.prefix.search(q, limit + 1, start), limit, catalog_key)
+        return [medicine_result(catalog.rows[p][1:]) for p in positions], next_key
+    sql, params = prefix_query(q, after)
+    rows = await db.fetch_all(sql + "LIMIT %s", (*params, limit + 1))
+    rows, next_key = keyset_page(rows, limit, lambda row: (None, row[7], row[8]))
+    return [medicine_result(row) for row in rows], next_key
+
+async def substring_search(q: str, limit: int = 100, after: tuple = None) -> tuple:
+    if indexes is not None and indexes.substring is not None:
+        catalog = indexes.catalog
+        start = catalog.position_after(after[1], after[2]) if after else 0
+        positions, next_key = keyset_page(indexes.substring.search(q, limit + 1, start), limit, catalog_key)
+        return [medicine_result(catalog.rows[p][1:]) for p in positions], next_key
+    sql, params = substring_query(q, after)
+    rows = await db.fetch_all(sql + "LIMIT %s", (*params, limit + 1))
+    rows, next_key = keyset_page(rows, limit, lambda row: (None, row[7], row[8]))
+    return [medicine_result(row) for row in rows], next_key
+
+async def fulltext_search(q: str, limit: int = 100, after: tuple = None) -> tuple:
+    sql, params = fulltext_query(q, after)
+    rows = await db.fetch_all(sql + "LIMIT %s", (*params, limit + 1))
+    rows, next_key = keyset_page(rows, limit, lambda row: (row[7], row[8], row[9]))
+    return [medicine_result(row, rank=row[7]) for row in rows], next_key
+
+async def fuzzy_search(q: str, limit: int = 100, after: tuple = None,
+                       threshold: float = None) -> tuple:
+    if indexes is not None and indexes.fuzzy is not None:
+        # SymSpell: bounded candidate generation, rows hydrated from the catalog
+        catalog = indexes.catalog
+        resume = (after[0], catalog.position_after(after[1], after[2])) if after else None
+        ranked, next_key = keyset_page(indexes.fuzzy.search(q, limit + 1, resume), limit,
+                                       lambda pair: catalog_key(pair[1], pair[0]))
+        key_length = max(len(normalize_name(q)), 1)
+        return [
+            medicine_result(catalog.rows[position][1:],
+                            similarity_score=round(max(0.0, 1 - distance / key_length), 4))
+            for distance, position in ranked
+        ], next_key
+    # Unknown after a failed detection at startup: detect now rather than
+    # serve (and cache) difflib scores that pg_trgm would not give
+    if not await trgm_ready():
+        return await fuzzy_fallback(q, limit, after,
+                                    FUZZY_FALLBACK_THRESHOLD if threshold is None else threshold)
+    # pg_trgm: `%` filters on trigram similarity through idx_name_trgm and
+    # `<->` (distance = 1 - similarity) orders nearest-first via idx_name_trgm_knn.
+    # The threshold is set for this transaction only, before the query runs.
+    keyset = ""
+    params = [q, q, q]
+    if after:
+        keyset = """AND (name <-> %s > %s::real
+                  OR (name <-> %s = %s::real AND (name_key, id) > (%s, %s)))"""
+        params += [q, after[0], q, *after]
+    rows = await db.fetch_all(f"""
+        SELECT sku_id, name, manufacturer_name, type, price, pack_size_label, short_composition,
+               similarity(name, %s) AS similarity_score, name <-> %s AS distance, name_key, id
+        FROM medicines
+        WHERE name %% %s AND deleted_at IS NULL {keyset}
+        ORDER BY distance, name_key, id
+        LIMIT %s
+    """, (*params, limit + 1),
+        settings={"pg_trgm.similarity_threshold": FUZZY_THRESHOLD if threshold is None else threshold})
+    rows, next_key = keyset_page(rows, limit, lambda row: (row[8], row[9], row[10]))
+    return [medicine_result(row, similarity_score=row[7]) for row in rows], next_key
+
+async def fuzzy_fallback(q: str, limit: int, after: tuple, threshold: float) -> tuple:
+    """Fuzzy search without pg_trgm: LIKE prefilter, rescored in Python"""
+    # Get a broader set of potential matches for fuzzy search; ordered so
+    # that every page rescores the same candidates
+    raw_results = await db.fetch_all("""
+        SELECT sku_id, name, manufacturer_name, type, price, pack_size_label, short_composition, name_key, id
+        FROM medicines
+        WHERE (LOWER(name) LIKE '%%' || LOWER(%s) || '%%'
+               OR LOWER(name) LIKE '%%' || LOWER(SUBSTRING(%s, 1, 3)) || '%%')
+          AND deleted_at IS NULL
+        ORDER BY name_key, id
+        LIMIT 200
+    """, (q, q))
+
+    # Calculate similarity scores in Python, best first
+    scored = []
+    for row in raw_results:
+        similarity = calculate_similarity(q, row[1])
+        if similarity > threshold:
+            scored.append(((-similarity, row[7], row[8]), row))
+    if after:
+        scored = [item for item in scored if item[0] > (-after[0], after[1], after[2])]
+    scored.sort(key=lambda item: item[0])
+    page, next_key = keyset_page(scored, limit, lambda item: (-item[0][0], item[0][1], item[0][2]))
+    return [medicine_result(row, similarity_score=-sort_key[0]) for sort_key, row in page], next_key
+
+SEARCHES = {
+    "prefix": prefix_search,
+    "substring": substring_search,
+    "fulltext": fulltext_search,
+    "fuzzy": fuzzy_search,
+}
+
+# Searches that support format=ndjson, and the SQL each one streams
+STREAM_QUERIES = {
+    "prefix": prefix_query,
+    "substring": substring_query,
+    "fulltext": fulltext_query,
+}
+
+async def stream_search(search_type: str, q: str, limit: int = None, after: tuple = None):
+    """Yield lists of result dicts for every match (or the first ``limit``)"""
+    engine = getattr(indexes, search_type, None) if indexes is not None else None
+    if engine is not None:
+        catalog = indexes.catalog
+        start = catalog.position_after(after[1], after[2]) if after else 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+            positions = engine.search(q, size, start)
+            if not positions:
+                break
+            yield [medicine_result(catalog.rows[p][1:]) for p in positions]
+            start = positions[-1] + 1
+            if remaining is not None:
+                remaining -= len(positions)
+        return
+    sql, params = STREAM_QUERIES[search_type](q, after)
+    if limit is not None:
+        sql, params = sql + "LIMIT %s", (*params, limit)
+    batches = db.stream(sql, params, STREAM_BATCH_SIZE)
+    try:
+        async for rows in batches:
+            if search_type == "fulltext":
+                yield [medicine_result(row, rank=row[7]) for row in rows]
+            else:
+                yield [medicine_result(row) for row in rows]
+    finally:
+        await batches.aclose()
+
+async def ndjson_response(request: Request, search_type: str, q: str, limit: int, cursor: str):
+    """Stream every match as one JSON object per line, a batch at a time.
+
+    Server-Timing covers the work done before the first batch is sent.
+    """
+    check_query(search_type, q)
+    timings = start_timings()
+    after = decode_cursor(search_type, cursor) if cursor else None
+    batches = stream_search(search_type, q, limit, after)
+    # Pull the first batch here so a failing query is still a plain HTTP 500
+    try:
+        first = await batches.__anext__()
+    except StopAsyncIteration:
+        first = []
+    except StreamLimitReached as e:
+        await batches.aclose()
+        raise HTTPException(status_code=503, detail=f"Too many concurrent streams: {str(e)}")
     except Exception as e:
+        await batches.aclose()
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@app.get("/search/substring")
-async def search_substring(q: str = Query(..., min_length=1, max_length=100)):
-    start_time = time.time()
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT name, manufacturer_name, type, price, pack_size_label, short_composition
-            FROM medicines
-            WHERE name ILIKE '%%' || %s || '%%'
-            ORDER BY name
-            LIMIT 100
-        """, (q,))
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                "name": row[0],
-                "manufacturer_name": row[1],
-                "type": row[2],
-                "price": row[3],
-                "pack_size_label": row[4],
-                "short_composition": row[5]
-            })
-        cursor.close()
-        conn.close()
-        execution_time = time.time() - start_time
+    async def body():
+        try:
+            batch = first
+            while True:
+                if batch:
+                    yield "".join(encode_results(result) + "\n" for result in batch)
+                if await request.is_disconnected():
+                    break
+                batch = await batches.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception:
+            logger.exception("NDJSON stream for %s search failed", search_type)
+        finally:
+            await batches.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson",
+                             headers={"Server-Timing": timings.header()})
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task and get its result (or exception).
+    The task is shielded, so one caller disconnecting does not cancel it for
+    the others. A task that fails after every caller has gone is logged here,
+    since nobody is left to receive its exception.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._waiters = {}  # task -> callers still awaiting it
+        self.executions = 0
+        self.deduplicated = 0
+
+    async def do(self, key: str, fn):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.executions += 1
+        else:
+            self.deduplicated += 1
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def _finished(self, key: str, task):
+        self._in_flight.pop(key, None)
+        waiters = self._waiters.pop(task, 0)
+        if task.cancelled():
+            return
+        error = task.exception()  # retrieved here, so asyncio never warns about it
+        if error is not None and not waiters:
+            logger.warning("Search %s failed after all its callers had gone: %r", key, error)
+
+    def running(self, key: str):
+        """The task executing ``key``, or None when nothing is in flight for it"""
+        return self._in_flight.get(key)
+
+    def stats(self) -> dict:
+        requests = self.executions + self.deduplicated
         return {
-            "query": q,
-            "type": "substring",
-            "results": results,
-            "count": len(results),
-            "execution_time_ms": round(execution_time * 1000, 2)
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "dedup_ratio": round(self.deduplicated / requests, 4) if requests else 0.0,
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@app.get("/search/fulltext")
-async def search_fulltext(q: str = Query(..., min_length=1, max_length=100)):
+single_flight = SingleFlight()
+
+def encode_cursor(search_type: str, sort_key) -> str:
+    """Opaque cursor for the page after the row with keyset ``sort_key`` (rank, name_key, id)"""
+    raw = json.dumps([search_type, *sort_key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+# Searches whose keyset starts with a numeric rank; the others carry rank None
+RANKED_SEARCHES = ("fulltext", "fuzzy")
+
+def decode_cursor(search_type: str, cursor: str) -> tuple:
+    """Inverse of encode_cursor; a malformed or foreign cursor is a 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, rank, name_key, id_ = json.loads(raw)
+        if search_type in RANKED_SEARCHES:
+            rank_valid = isinstance(rank, (int, float)) and not isinstance(rank, bool) and math.isfinite(rank)
+        else:
+            rank_valid = rank is None
+        valid = (kind == search_type and rank_valid and isinstance(name_key, str)
+                 and isinstance(id_, int) and not isinstance(id_, bool))
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return (rank, name_key, id_)
+
+def check_query(search_type: str, q: str):
+    """Reject a prefix query with nothing to match (it would match every name)"""
+    if search_type in ("prefix", "hybrid") and not prefix_key(q):
+        raise HTTPException(status_code=400, detail="Query must contain at least one non-space character")
+
+def search_key(search_type: str, q: str, limit: int, cursor: str, filters: dict) -> str:
+    """Identity of a search: equal keys are guaranteed to return equal results"""
+    # Every engine is case-insensitive; prefix (both engines) and the SymSpell
+    # fuzzy engine also ignore accents and repeated spaces (prefix keeps one
+    # trailing space). pg_trgm similarity and the difflib fallback do not, so
+    # their keys must keep them.
+    symspell = search_type == "fuzzy" and indexes is not None and indexes.fuzzy is not None
+    if search_type == "prefix":
+        query = prefix_key(q)
+    else:
+        query = normalize_name(q) if symspell else q.lower()
+    filter_part = "&".join(f"{name}={value}" for name, value in sorted(filters.items()))
+    return f"{search_type}:{len(query)}:{query}:limit={limit}&cursor={cursor or ''}&{filter_part}"
+
+# Server-Timing phases, in the order a search goes through them
+TIMING_PHASES = ("checkout", "execute", "fetch", "postprocess", "serialize")
+
+class PhaseTimings(dict):
+    """Seconds per phase for one request, filled in by db.record_phase and the handlers"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+
+    def breakdown(self) -> dict:
+        """Milliseconds per phase, plus the total so far"""
+        timings = {phase: round(self[phase] * 1000, 3) for phase in TIMING_PHASES if phase in self}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return timings
+
+    def header(self, cached: bool = None) -> str:
+        """Server-Timing header value for the phases recorded so far"""
+        parts = [f"{phase};dur={ms}" for phase, ms in self.breakdown().items()]
+        if cached is not None:
+            parts.append(f'cache;desc="{"hit" if cached else "miss"}"')
+        return ", ".join(parts)
+
+def start_timings() -> PhaseTimings:
+    """Begin the phase breakdown of the current request"""
+    timings = PhaseTimings()
+    phase_times.set(timings)
+    return timings
+
+def search_response(body: dict, timings: PhaseTimings, debug: bool = False) -> Response:
+    """JSON response carrying a Server-Timing header.
+
+    The body is serialized here rather than by FastAPI so serialization is
+    timed too; with ``debug`` the breakdown is also appended as ``timings``.
+    """
+    started = time.perf_counter()
+    content = encode_results(body)
+    timings["serialize"] = time.perf_counter() - started
+    header = timings.header(body.get("cached"))
+    if debug:
+        content = content[:-1] + ',"timings":' + json.dumps(timings.breakdown()) + "}"
+    return Response(content, media_type="application/json", headers={"Server-Timing": header})
+
+async def execute_search(search_type: str, q: str, limit: int, after, filters: dict) -> tuple:
+    """Run one engine, recording its database time and its Python time separately"""
+    spent = [0.0]
+    token = query_time.set(spent)
+    started = time.perf_counter()
+    try:
+        return await SEARCHES[search_type](q, limit, after, **filters)
+    finally:
+        query_time.reset(token)
+        python_time = max(time.perf_counter() - started - spent[0], 0.0)
+        record_phase("postprocess", python_time)
+        metrics.search_db_time.observe(spent[0], search_type)
+        metrics.search_python_time.observe(python_time, search_type)
+
+class EngineBusy(Exception):
+    """Raised by run_search(join_only=True) when a search would start a new execution"""
+
+async def run_search(search_type: str, q: str, limit: int = 100, cursor: str = None, *,
+                     join_only: bool = False, **filters) -> dict:
+    """Run one search through the result cache and build the response body.
+
+    With ``join_only`` the search is answered only from the cache or by joining
+    an identical execution already in flight; otherwise :class:`EngineBusy`.
+    """
     start_time = time.time()
+    check_query(search_type, q)
+    after = decode_cursor(search_type, cursor) if cursor else None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Smart search with ranking based on position and exact matches
-        cursor.execute("""
-            SELECT name, manufacturer_name, type, price, pack_size_label, short_composition,
-                   CASE 
-                       WHEN LOWER(name) = LOWER(%s) THEN 1.0
-                       WHEN LOWER(name) LIKE LOWER(%s) || ' %%' THEN 0.9
-                       WHEN LOWER(name) LIKE '%% ' || LOWER(%s) || ' %%' THEN 0.8
-                       WHEN LOWER(name) LIKE '%% ' || LOWER(%s) THEN 0.7
-                       WHEN LOWER(name) LIKE LOWER(%s) || '%%' THEN 0.6
-                       ELSE 0.5 
-                   END as rank
-            FROM medicines
-            WHERE LOWER(name) LIKE '%%' || LOWER(%s) || '%%'
-            ORDER BY rank DESC, name
-            LIMIT 100
-        """, (q, q, q, q, q, q))
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                "name": row[0],
-                "manufacturer_name": row[1],
-                "type": row[2],
-                "price": row[3],
-                "pack_size_label": row[4],
-                "short_composition": row[5],
-                "rank": row[6]
-            })
-        cursor.close()
-        conn.close()
+        key = search_key(search_type, q, limit, cursor, filters)
+        # Cache keys also carry the dataset version; nothing is cached until it is known
+        cache_key = f"v{dataset_version}:{key}" if result_cache is not None and dataset_version is not None else None
+        page = await result_cache.get(cache_key) if cache_key is not None else None
+        cached = page is not None
+        if not cached:
+            if join_only and single_flight.running(key) is None:
+                raise EngineBusy(f"{search_type} engine is busy")
+
+            async def execute_and_cache():
+                # Cached by the shared execution itself, so the page is kept
+                # even when every caller waiting for it has been cancelled
+                page = await execute_search(search_type, q, limit, after, filters)
+                if cache_key is not None:
+                    await result_cache.set(cache_key, page)
+                return page
+
+            page = await single_flight.do(key, execute_and_cache)
+        results, next_key = page
         execution_time = time.time() - start_time
+        metrics.search_duration.observe(execution_time, search_type, "cached" if cached else "ok")
+        metrics.search_results.observe(len(results), search_type)
         return {
             "query": q,
-            "type": "fulltext",
+            "type": search_type,
             "results": results,
             "count": len(results),
+            "next_cursor": encode_cursor(search_type, next_key) if next_key else None,
+            "cached": cached,
             "execution_time_ms": round(execution_time * 1000, 2)
         }
+    except EngineBusy:
+        raise
     except Exception as e:
+        metrics.search_duration.observe(time.time() - start_time, search_type, "error")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+# ?limit= is the page size (100 when omitted; everything for format=ndjson);
+# ?cursor= is the next_cursor of the previous page
+LIMIT_QUERY = Query(None, ge=1, le=SEARCH_MAX_LIMIT)
+CURSOR_QUERY = Query(None, max_length=1024)
+FORMAT_QUERY = Query("json", pattern="^(json|ndjson)$")
+# ?debug=true adds the Server-Timing breakdown to the body as "timings"
+DEBUG_QUERY = Query(False)
+
+@app.get("/search/prefix")
+async def search_prefix(request: Request, q: str = Query(..., min_length=1, max_length=100),
+                        limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = CURSOR_QUERY,
+                        format: str = FORMAT_QUERY, debug: bool = DEBUG_QUERY):
+    if format == "ndjson":
+        return await ndjson_response(request, "prefix", q, limit, cursor)
+    timings = start_timings()
+    return search_response(await run_search("prefix", q, limit or 100, cursor), timings, debug)
+
+@app.get("/search/substring")
+async def search_substring(request: Request, q: str = Query(..., min_length=1, max_length=100),
+                           limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = CURSOR_QUERY,
+                           format: str = FORMAT_QUERY, debug: bool = DEBUG_QUERY):
+    if format == "ndjson":
+        return await ndjson_response(request, "substring", q, limit, cursor)
+    timings = start_timings()
+    return search_response(await run_search("substring", q, limit or 100, cursor), timings, debug)
+
+@app.get("/search/fulltext")
+async def search_fulltext(request: Request, q: str = Query(..., min_length=1, max_length=100),
+                          limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = CURSOR_QUERY,
+                          format: str = FORMAT_QUERY, debug: bool = DEBUG_QUERY):
+    if format == "ndjson":
+        return await ndjson_response(request, "fulltext", q, limit, cursor)
+    timings = start_timings()
+    return search_response(await run_search("fulltext", q, limit or 100, cursor), timings, debug)
+
 @app.get("/search/fuzzy")
-async def search_fuzzy(q: str = Query(..., min_length=1, max_length=100)):
+async def search_fuzzy(q: str = Query(..., min_length=1, max_length=100),
+                       threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+                       limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = CURSOR_QUERY,
+                       debug: bool = DEBUG_QUERY):
+    timings = start_timings()
+    return search_response(await run_search("fuzzy", q, limit or 100, cursor, threshold=threshold),
+                           timings, debug)
+
+def reciprocal_rank_fusion(ranked: dict, k: int = RRF_K) -> list:
+    """Merge ranked result lists ({engine: results}) by reciprocal-rank fusion.
+
+    Each result scores ``sum(1 / (k + rank))`` over the engines that returned
+    it; results are identified by sku_id, so a medicine found by several
+    engines appears once, with every engine's score fields.
+    """
+    fused = {}
+    for engine, results in ranked.items():
+        for rank, result in enumerate(results, start=1):
+            key = result["sku_id"] or result["name"]
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = dict(result, score=0.0, engines=[])
+            elif engine in entry["engines"]:
+                continue
+            else:
+                for field, value in result.items():
+                    entry.setdefault(field, value)
+            entry["score"] += 1.0 / (k + rank)
+            entry["engines"].append(engine)
+    merged = sorted(fused.values(), key=lambda entry: (-entry["score"], entry["name"] or ""))
+    for entry in merged:
+        entry["score"] = round(entry["score"], 6)
+    return merged
+
+# Executions per engine still running after a hybrid call gave up on them
+hybrid_detached = {engine: set() for engine in HYBRID_ENGINES}
+
+def detach_search(engine: str, key: str):
+    """Track the execution of ``key`` as detached until it finishes"""
+    task = single_flight.running(key)
+    if task is None or task in hybrid_detached[engine]:
+        return
+    hybrid_detached[engine].add(task)
+    task.add_done_callback(hybrid_detached[engine].discard)
+
+@app.get("/search")
+async def search_hybrid(q: str = Query(..., min_length=1, max_length=100),
+                        limit: Optional[int] = LIMIT_QUERY, debug: bool = DEBUG_QUERY):
+    """Prefix, full-text and fuzzy search at once, fused into one ranking.
+
+    The engines run concurrently and each gets HYBRID_ENGINE_TIMEOUT_MS; an
+    engine that misses the budget is left out and the response is marked
+    ``partial``, so latency is bounded by the budget rather than by the sum
+    of the engines. Server-Timing phases are summed over the engines.
+
+    A timed-out query keeps running and caches its page when it finishes, so
+    the next call gets it from the cache. While HYBRID_MAX_DETACHED of an
+    engine's queries are still running that way, the engine answers only from
+    the cache or an identical running query and is otherwise reported ``busy``.
+    """
+    check_query("hybrid", q)
+    timings = start_timings()
+    start_time = time.time()
+    limit = limit or 100
+    tasks = {
+        engine: asyncio.ensure_future(
+            run_search(engine, q, limit, join_only=len(hybrid_detached[engine]) >= HYBRID_MAX_DETACHED))
+        for engine in HYBRID_ENGINES
+    }
+    await asyncio.wait(tasks.values(), timeout=HYBRID_ENGINE_TIMEOUT_MS / 1000)
+
+    ranked = {}
+    engines = {}
+    for engine, task in tasks.items():
+        if not task.done():
+            # The single-flight execution is shielded: it keeps running and caches its page
+            task.cancel()
+            detach_search(engine, search_key(engine, q, limit, None, {}))
+            engines[engine] = {"status": "timeout"}
+        elif isinstance(task.exception(), EngineBusy):
+            engines[engine] = {"status": "busy"}
+        elif task.exception() is not None:
+            error = task.exception()
+            engines[engine] = {"status": "error", "error": getattr(error, "detail", str(error))}
+        else:
+            response = task.result()
+            ranked[engine] = response["results"]
+            engines[engine] = {
+                "status": "ok",
+                "count": response["count"],
+                "cached": response["cached"],
+                "execution_time_ms": response["execution_time_ms"],
+            }
+    if not ranked:
+        raise HTTPException(status_code=500, detail="Search failed: no engine answered in time")
+
+    started = time.perf_counter()
+    results = reciprocal_rank_fusion(ranked)[:limit]
+    record_phase("postprocess", time.perf_counter() - started)
+    execution_time = time.time() - start_time
+    return search_response({
+        "query": q,
+        "type": "hybrid",
+        "results": results,
+        "count": len(results),
+        "engines": engines,
+        "partial": len(ranked) < len(tasks),
+        "execution_time_ms": round(execution_time * 1000, 2)
+    }, timings, debug)
+
+class BatchItem(BaseModel):
+    """One query of a POST /search/batch request"""
+    id: Optional[str] = None
+    type: Literal["prefix", "substring", "fulltext", "fuzzy"]
+    q: str = Field(..., min_length=1, max_length=100)
+    limit: Optional[int] = Field(None, ge=1, le=SEARCH_MAX_LIMIT)
+    cursor: Optional[str] = Field(None, max_length=1024)
+    threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+
+async def run_batch_item(item: BatchItem) -> dict:
+    """run_search for one batch item; failures are reported in the item instead of raised"""
+    filters = {}
+    if item.type == "fuzzy":
+        filters["threshold"] = item.threshold
     start_time = time.time()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Get a broader set of potential matches for fuzzy search
-        cursor.execute("""
-            SELECT name, manufacturer_name, type, price, pack_size_label, short_composition
-            FROM medicines
-            WHERE LOWER(name) LIKE '%%' || LOWER(%s) || '%%'
-               OR LOWER(name) LIKE '%%' || LOWER(SUBSTRING(%s, 1, 3)) || '%%'
-            LIMIT 200
-        """, (q, q))
-        
-        raw_results = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        # Calculate similarity scores in Python
-        results = []
-        for row in raw_results:
-            similarity = calculate_similarity(q, row[0])
-            if similarity > 0.1:  # Filter threshold
-                results.append({
-                    "name": row[0],
-                    "manufacturer_name": row[1],
-                    "type": row[2],
-                    "price": row[3],
-                    "pack_size_label": row[4],
-                    "short_composition": row[5],
-                    "similarity_score": similarity
-                })
-        
-        # Sort by similarity score
-        results.sort(key=lambda x: x["similarity_score"], reverse=True)
-        results = results[:100]  # Limit to 100
-        
-        execution_time = time.time() - start_time
+        return await run_search(item.type, item.q, item.limit or 100, item.cursor, **filters)
+    except HTTPException as e:
         return {
-            "query": q,
-            "type": "fuzzy",
-            "results": results,
-            "count": len(results),
-            "execution_time_ms": round(execution_time * 1000, 2)
+            "query": item.q,
+            "type": item.type,
+            "error": e.detail,
+            "status_code": e.status_code,
+            "execution_time_ms": round((time.time() - start_time) * 1000, 2)
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@app.post("/search/batch")
+async def search_batch(items: List[BatchItem], debug: bool = DEBUG_QUERY):
+    """Run many searches in one request, concurrently over the connection pool.
+
+    Results are keyed by each item's ``id`` (its position in the list when
+    omitted) and carry their own timing; a failing item gets an ``error``
+    instead of failing the whole batch. Server-Timing phases are summed over
+    the items.
+    """
+    if len(items) > SEARCH_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX_ITEMS} items per batch")
+    ids = [item.id if item.id is not None else str(i) for i, item in enumerate(items)]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Batch item ids must be unique")
+    timings = start_timings()
+    start_time = time.time()
+    # Concurrency is bounded by the database executor: one thread per connection
+    # left after the stream and EXPLAIN reservations (DB_POOL_MAX - STREAM_MAX_CONCURRENT - 1)
+    responses = await asyncio.gather(*(run_batch_item(item) for item in items))
+    return search_response({
+        "results": dict(zip(ids, responses)),
+        "count": len(items),
+        "errors": sum(1 for response in responses if "error" in response),
+        "execution_time_ms": round((time.time() - start_time) * 1000, 2)
+    }, timings, debug)
+
+@app.get("/health/coalescing")
+async def coalescing_stats():
+    """How many concurrent identical searches shared another request's execution"""
+    return single_flight.stats()
+
+@app.get("/health/cache")
+async def cache_stats():
+    """Result cache statistics (hits, misses, evictions, size)"""
+    if result_cache is None:
+        return {"backend": "none"}
+    return result_cache.stats()
+
+def require_admin(token: Optional[str]):
+    """404 while ADMIN_TOKEN is unset, 403 unless ``token`` matches it"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+ADMIN_TOKEN_HEADER = Header(None, alias="X-Admin-Token")
+
+@app.get("/admin/slow-queries")
+async def slow_queries(x_admin_token: Optional[str] = ADMIN_TOKEN_HEADER):
+    """Queries over SLOW_QUERY_THRESHOLD_MS, newest first, with their EXPLAIN (ANALYZE, BUFFERS) plans"""
+    require_admin(x_admin_token)
+    log = db.slow_queries
+    if log is None:
+        return {"enabled": False, "entries": []}
+    return {
+        "enabled": True,
+        "threshold_ms": log.threshold_ms,
+        "explain": log.explain,
+        "recorded": log.recorded,
+        "entries": log.entries(),
+    }
+
+@app.delete("/admin/slow-queries")
+async def clear_slow_queries(x_admin_token: Optional[str] = ADMIN_TOKEN_HEADER):
+    """Empty the slow-query ring buffer"""
+    require_admin(x_admin_token)
+    if db.slow_queries is not None:
+        db.slow_queries.clear()
+    return {"cleared": db.slow_queries is not None}
+
+@metrics.registry.add_collector
+def collect_runtime_metrics():
+    """Pool, cache, coalescing and dataset gauges, read at scrape time"""
+    pool = db.pool.stats()
+    executor = db.executor_stats()
+    coalescing = single_flight.stats()
+    families = [
+        ("pharmaverse_db_pool_connections", "gauge", "Pooled connections by state",
+         [({"state": "in_use"}, pool["in_use"]), ({"state": "idle"}, pool["idle"])]),
+        ("pharmaverse_db_pool_max_connections", "gauge", "Configured pool size limit", [({}, pool["max_size"])]),
+        ("pharmaverse_db_pool_waiters", "gauge", "Threads waiting for a connection", [({}, pool["waiters"])]),
+        ("pharmaverse_db_queued_calls", "gauge", "Database calls waiting for an executor thread",
+         [({}, executor["queued"])]),
+        ("pharmaverse_db_pool_checkouts_total", "counter", "Connections checked out", [({}, pool["checkouts"])]),
+        ("pharmaverse_db_pool_checkout_timeouts_total", "counter", "Checkouts that timed out",
+         [({}, pool["checkout_timeouts"])]),
+        ("pharmaverse_search_coalesced_total", "counter", "Searches by single-flight outcome",
+         [({"outcome": "executed"}, coalescing["executions"]),
+          ({"outcome": "deduplicated"}, coalescing["deduplicated"])]),
+        ("pharmaverse_dataset_version", "gauge", "Dataset version currently served", [({}, dataset_version)]),
+        ("pharmaverse_medicines", "gauge", "Live medicines at the current dataset version", [({}, medicines_count)]),
+    ]
+    if result_cache is not None:
+        cache = result_cache.stats()
+        families.append(("pharmaverse_cache_lookups_total", "counter", "Result cache lookups by outcome",
+                         [({"outcome": "hit"}, cache["hits"]), ({"outcome": "miss"}, cache["misses"])]))
+        if "entries" in cache:
+            families.append(("pharmaverse_cache_entries", "gauge", "Entries held by the result cache",
+                             [({}, cache["entries"])]))
+            families.append(("pharmaverse_cache_bytes", "gauge", "Approximate bytes held by the result cache",
+                             [({}, cache["bytes"])]))
+            families.append(("pharmaverse_cache_evictions_total", "counter", "Entries evicted to stay under max bytes",
+                             [({}, cache["evictions"])]))
+    return families
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of request, search, pool and cache metrics"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
@@ -784,18 +1542,3 @@ if __name__ == "__main__":
         port=int(os.getenv("PORT", 8000)),
         reload=True,
     )
-
-
-def calculate_similarity(query: str, text: str) -> float:
-    """Return a similarity ratio between 0 and 1 for two strings.
-
-    Uses difflib.SequenceMatcher which is available in the stdlib. This
-    lets the fuzzy endpoint work even if the pg_trgm extension or
-    similarity() function is not available on the database.
-    """
-    try:
-        if not text:
-            return 0.0
-        return difflib.SequenceMatcher(None, query.lower(), text.lower()).ratio()
-    except Exception:
-        return 0.0
\ No newline at end of file
@@ -1,12 +1,22 @@
+import argparse
+import asyncio
 import json
+import math
+import random
 import time
 import requests
 import statistics
-from typing import Dict, List
+from typing import Dict, List, Optional
 import os
 
+# One address for every request (health check and queries alike)
+DEFAULT_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+# Upper bounds (ms) of the latency histogram written by the load mode
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
 class BenchmarkRunner:
-    def __init__(self, api_base_url: str = "http://localhost:8001"):
+    def __init__(self, api_base_url: str = DEFAULT_BASE_URL):
         self.api_base_url = api_base_url
         self.results = {}
 
@@ -105,10 +115,209 @@ class BenchmarkRunner:
 
         print(f"Submission file generated: {output_file}")
 
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples: List[tuple], elapsed: float) -> Dict:
+    """Throughput, latency percentiles and errors for (latency_ms, error) samples"""
+    latencies = sorted(latency for latency, error in samples if error is None)
+    errors = {}
+    for _, error in samples:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    total = len(samples)
+    return {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "error_kinds": errors,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "p99.9": round(percentile(latencies, 99.9), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+def latency_histogram(samples: List[tuple]) -> Dict:
+    """Successful request counts per latency bucket (upper bounds in ms, last is +Inf)"""
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for latency, error in samples:
+        if error is None:
+            counts[next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if latency <= bound),
+                        len(HISTOGRAM_BUCKETS_MS))] += 1
+    return {"buckets_ms": list(HISTOGRAM_BUCKETS_MS) + ["+Inf"], "counts": counts}
+
+class LoadGenerator:
+    """Concurrent load against the search endpoints using asyncio and httpx.
+
+    Closed loop (the default): ``concurrency`` workers each send the next
+    request as soon as the previous one returns. Open loop (``rps`` set):
+    requests start on a fixed schedule whether or not earlier ones finished,
+    with at most ``concurrency`` in flight; latency is measured from the
+    scheduled start, so a stalled server shows up as queueing rather than as
+    fewer, faster samples. Samples from the ``warmup`` seconds are discarded.
+    """
+
+    def __init__(self, base_url: str, queries: List[Dict], concurrency: int = 10, duration: float = 30.0,
+                 rps: Optional[float] = None, warmup: float = 5.0, timeout: float = 10.0,
+                 mix: Optional[Dict[str, float]] = None, seed: int = 0):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rps = rps
+        self.warmup = warmup
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.by_type = {}
+        for query in queries:
+            self.by_type.setdefault(query['type'], []).append(query['query'])
+        # Without an explicit mix, each query type is weighted by how often it appears
+        weights = mix or {query_type: len(texts) for query_type, texts in self.by_type.items()}
+        unknown = set(weights) - set(self.by_type)
+        if unknown:
+            raise ValueError(f"No benchmark queries of type: {', '.join(sorted(unknown))}")
+        self.types = [query_type for query_type, weight in weights.items() if weight > 0]
+        self.weights = [weights[query_type] for query_type in self.types]
+        self.samples = []  # (query_type, latency_ms, error) after warm-up
+        self.recording = False
+
+    def next_query(self) -> tuple:
+        query_type = self.random.choices(self.types, self.weights)[0]
+        return query_type, self.random.choice(self.by_type[query_type])
+
+    async def send(self, client, query_type: str, query: str, started: float):
+        error = None
+        try:
+            response = await client.get(f"/search/{query_type}", params={"q": query})
+            if response.status_code >= 400:
+                error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = type(e).__name__
+        if self.recording:
+            self.samples.append((query_type, (time.perf_counter() - started) * 1000, error))
+
+    async def closed_loop(self, client, deadline: float):
+        async def worker():
+            while time.perf_counter() < deadline:
+                query_type, query = self.next_query()
+                await self.send(client, query_type, query, time.perf_counter())
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def open_loop(self, client, deadline: float):
+        slots = asyncio.Semaphore(self.concurrency)
+        interval = 1.0 / self.rps
+        tasks = set()
+
+        async def fire(query_type, query, scheduled):
+            async with slots:
+                await self.send(client, query_type, query, scheduled)
+
+        scheduled = time.perf_counter()
+        while scheduled < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(fire(*self.next_query(), scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            scheduled += interval
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run(self) -> Dict:
+        try:
+            import httpx
+        except ImportError as e:
+            raise RuntimeError("Load mode requires the 'httpx' package (pip install httpx)") from e
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        phase = self.open_loop if self.rps else self.closed_loop
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            if self.warmup > 0:
+                print(f"Warming up for {self.warmup:g}s...")
+                await phase(client, time.perf_counter() + self.warmup)
+            print(f"Measuring for {self.duration:g}s "
+                  f"({f'{self.rps:g} req/s open loop' if self.rps else 'closed loop'}, "
+                  f"concurrency {self.concurrency})...")
+            self.recording = True
+            started = time.perf_counter()
+            await phase(client, started + self.duration)
+            elapsed = time.perf_counter() - started
+            self.recording = False
+
+        samples = [(latency, error) for _, latency, error in self.samples]
+        by_type = {}
+        for query_type in self.types:
+            typed = [(latency, error) for t, latency, error in self.samples if t == query_type]
+            by_type[query_type] = summarize(typed, elapsed)
+        return {
+            "config": {
+                "base_url": self.base_url,
+                "mode": "open" if self.rps else "closed",
+                "concurrency": self.concurrency,
+                "duration_s": self.duration,
+                "target_rps": self.rps,
+                "warmup_s": self.warmup,
+                "timeout_s": self.timeout,
+                "mix": dict(zip(self.types, self.weights)),
+            },
+            "elapsed_s": round(elapsed, 3),
+            "overall": summarize(samples, elapsed),
+            "by_type": by_type,
+            "histogram": latency_histogram(samples),
+        }
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse --mix "prefix=3,fuzzy=1" into {type: weight}"""
+    mix = {}
+    for part in value.split(","):
+        query_type, _, weight = part.partition("=")
+        mix[query_type.strip()] = float(weight) if weight else 1.0
+    return mix
+
+def print_load_report(report: Dict):
+    overall = report["overall"]
+    latency = overall["latency_ms"]
+    print(f"{overall['requests']} requests in {report['elapsed_s']}s: {overall['throughput_rps']} req/s, "
+          f"error rate {overall['error_rate']:.2%}")
+    print(f"latency ms  p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  "
+          f"p99.9 {latency['p99.9']}  max {latency['max']}")
+    for query_type, summary in report["by_type"].items():
+        typed = summary["latency_ms"]
+        print(f"  {query_type:<10} {summary['requests']:>7} req  p50 {typed['p50']}  p99 {typed['p99']}  "
+              f"errors {summary['errors']}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PharmaVerse search API")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL,
+                        help="API address used for every request (default: $API_BASE_URL or %(default)s)")
+    parser.add_argument("--queries", default="benchmark_queries.json", help="benchmark query file")
+    parser.add_argument("--load", action="store_true",
+                        help="run a concurrent load test instead of the sequential benchmark")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="load mode: workers (closed loop) or max in-flight requests (open loop)")
+    parser.add_argument("--duration", type=float, default=30, help="load mode: measured seconds")
+    parser.add_argument("--rps", type=float, default=None,
+                        help="load mode: open-loop target requests per second (default: closed loop)")
+    parser.add_argument("--warmup", type=float, default=5, help="load mode: seconds of unrecorded warm-up")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help='load mode: query type weights, e.g. "prefix=3,substring=1,fuzzy=1"')
+    parser.add_argument("--timeout", type=float, default=10, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="load mode: random seed for the query mix")
+    parser.add_argument("--output", default=None,
+                        help="results file (default: benchmark_results.json, or load_results.json with --load)")
+    args = parser.parse_args()
+
     # Check if API is running
     try:
-        response = requests.get("http://localhost:8000/health", timeout=5)
+        response = requests.get(f"{args.base_url}/health", timeout=5)
         if response.status_code != 200:
             print("API server is not running. Please start the server first.")
             return
@@ -117,17 +326,29 @@ def main():
         return
 
     # Run benchmarks
-    runner = BenchmarkRunner()
+    runner = BenchmarkRunner(args.base_url)
 
     # Path to benchmark queries
-    benchmark_file = "benchmark_queries.json"
+    benchmark_file = args.queries
 
     if not os.path.exists(benchmark_file):
         print(f"Benchmark file not found: {benchmark_file}")
         return
 
+    if args.load:
+        generator = LoadGenerator(args.base_url, runner.load_benchmark_queries(benchmark_file),
+                                  concurrency=args.concurrency, duration=args.duration, rps=args.rps,
+                                  warmup=args.warmup, timeout=args.timeout, mix=args.mix, seed=args.seed)
+        report = asyncio.run(generator.run())
+        output_file = args.output or "load_results.json"
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print_load_report(report)
+        print(f"Load test results saved to {output_file}")
+        return
+
     # Run benchmarks and generate submission
-    results = runner.run_benchmarks(benchmark_file)
+    results = runner.run_benchmarks(benchmark_file, args.output or "benchmark_results.json")
     runner.generate_submission_json(results)
 
 if __name__ == "__main__":
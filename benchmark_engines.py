@@ -0,0 +1,388 @@
+"""
+Offline microbenchmark of the search engines: no server or database needed.
+
+The medicines are read straight from the import data files, de-duplicated the
+way import_data.py does, and put into a MedicineCatalog. Every search
+strategy then runs over the queries in benchmark_queries.json and over a
+synthetic set drawn from the catalog:
+
+- sql_*: Python emulations of what the SQL engines return (sequential scans
+  with the same filters and ordering), as a semantic and speed baseline
+- fuzzy_difflib: the pg_trgm-less fallback, scored with calculate_similarity
+- memory_*: the in-memory engines from search_index.py
+
+Results (build time and memory, ops/sec, latency percentiles, allocated
+bytes and blocks per query, peak RSS) are written as JSON tagged with the git commit, so runs
+from different commits can be compared with --compare.
+"""
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+
+from import_data import iter_json_records, medicine_row, peak_memory_mb
+from search_index import (FUZZY_FALLBACK_THRESHOLD, MedicineCatalog, PrefixIndex, SymSpellIndex, TrigramIndex,
+                          calculate_similarity, normalize_name, prefix_key)
+
+DATA_DIR = Path("DB_Dataset/DB_Dataset/data")
+
+# Rows returned per query, as in a default API page
+PAGE_SIZE = 100
+
+# ts_rank_cd weights of the A (name) and B (short_composition) sections
+NAME_WEIGHT = 1.0
+COMPOSITION_WEIGHT = 0.4
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def load_catalog_from_files(data_dir: Path) -> MedicineCatalog:
+    """Catalog of the data files as import_data.py would load them (ids in import order)"""
+    seen_sku_ids = set()
+    records = []
+    for path in sorted(data_dir.glob("*.json")):
+        for medicine in iter_json_records(path):
+            row = medicine_row(medicine)
+            if row is None:
+                continue
+            sku_id = row[0] or f"auto_{len(records)}"
+            if sku_id in seen_sku_ids:
+                continue
+            seen_sku_ids.add(sku_id)
+            _, name, manufacturer, _, type_, price, pack_size, composition = row
+            records.append((normalize_name(name), len(records) + 1, sku_id, name, manufacturer,
+                            type_, price, pack_size, composition))
+    # name_key is COLLATE "C": code point order, the same as Python's str order
+    records.sort(key=lambda record: (record[0], record[1]))
+    return MedicineCatalog.from_records(records)
+
+
+def words(text: str) -> list:
+    """Crude stand-in for the english text search parser: lower-cased words, plural 's' dropped"""
+    return [word[:-1] if len(word) > 3 and word.endswith("s") else word
+            for word in _WORD_RE.findall(text.lower())] if text else []
+
+
+class ScanEngine:
+    """What the SQL engines return, computed by scanning the catalog in Python.
+
+    Prefix and substring match like ``name_key LIKE 'key%'`` and ``name ILIKE
+    '%q%'``. Full-text approximates websearch_to_tsquery without stemming or
+    stop words: every query word must occur, and the rank sums the name and
+    composition weights of the matches. Fuzzy follows fuzzy_fallback: the first
+    200 LIKE candidates, rescored with calculate_similarity.
+    """
+
+    def __init__(self, catalog: MedicineCatalog):
+        self.catalog = catalog
+        self.lower_names = [(row[2] or "").lower() for row in catalog.rows]
+        self.name_words = [set(words(row[2])) for row in catalog.rows]
+        self.composition_words = [set(words(row[7])) for row in catalog.rows]
+
+    def prefix(self, q: str, limit: int) -> list:
+        key = prefix_key(q)
+        matches = (position for position, name_key in enumerate(self.catalog.keys)
+                   if key and name_key.startswith(key))
+        return list(islice(matches, limit))
+
+    def substring(self, q: str, limit: int) -> list:
+        needle = q.lower()
+        matches = (position for position, name in enumerate(self.lower_names) if needle in name)
+        return list(islice(matches, limit))
+
+    def fulltext(self, q: str, limit: int) -> list:
+        terms = words(q)
+        if not terms:
+            return []
+        ranked = []
+        for position in range(len(self.catalog)):
+            name_words = self.name_words[position]
+            composition_words = self.composition_words[position]
+            rank = 0.0
+            for term in terms:
+                if term in name_words:
+                    rank += NAME_WEIGHT
+                elif term in composition_words:
+                    rank += COMPOSITION_WEIGHT
+                else:
+                    break
+            else:
+                ranked.append((-rank, position))
+        ranked.sort()
+        return [position for _, position in ranked[:limit]]
+
+    def fuzzy(self, q: str, limit: int, threshold: float = FUZZY_FALLBACK_THRESHOLD) -> list:
+        needle, head = q.lower(), q[:3].lower()
+        candidates = (position for position, name in enumerate(self.lower_names)
+                      if needle in name or head in name)
+        scored = []
+        for position in islice(candidates, 200):
+            similarity = calculate_similarity(q, self.catalog.rows[position][2])
+            if similarity > threshold:
+                scored.append((-similarity, position))
+        scored.sort()
+        return [position for _, position in scored[:limit]]
+
+
+# Index structures, each built once per run: name -> constructor over a catalog
+BUILDS = {
+    "scan": ScanEngine,
+    "prefix_index": PrefixIndex,
+    "trigram_index": TrigramIndex,
+    "symspell_index": SymSpellIndex,
+}
+
+# Strategy -> (query type, structure it runs on, search call)
+ENGINES = {
+    "sql_prefix": ("prefix", "scan", lambda engine, q: engine.prefix(q, PAGE_SIZE)),
+    "sql_substring": ("substring", "scan", lambda engine, q: engine.substring(q, PAGE_SIZE)),
+    "sql_fulltext": ("fulltext", "scan", lambda engine, q: engine.fulltext(q, PAGE_SIZE)),
+    "fuzzy_difflib": ("fuzzy", "scan", lambda engine, q: engine.fuzzy(q, PAGE_SIZE)),
+    "memory_prefix": ("prefix", "prefix_index", lambda engine, q: engine.search(q, PAGE_SIZE)),
+    "memory_substring": ("substring", "trigram_index", lambda engine, q: engine.search(q, PAGE_SIZE)),
+    "memory_symspell": ("fuzzy", "symspell_index", lambda engine, q: engine.search(q, PAGE_SIZE)),
+}
+
+
+def benchmark_queries(path: Path) -> dict:
+    """{query type: [query, ...]} from benchmark_queries.json"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    queries = {}
+    for query in data.get('queries', {}).values():
+        queries.setdefault(query['type'], []).append(query['query'])
+    return queries
+
+
+def synthetic_queries(catalog: MedicineCatalog, per_type: int, seed: int = 0) -> dict:
+    """Deterministic queries drawn from catalog names, with one typo for the fuzzy set"""
+    rng = random.Random(seed)
+    names = [row[2] for row in catalog.rows if row[2]]
+    letters = "abcdefghijklmnopqrstuvwxyz"
+
+    def typo(word: str) -> str:
+        i = rng.randrange(len(word))
+        edit = rng.choice(("delete", "replace", "insert", "swap"))
+        if edit == "delete":
+            return word[:i] + word[i + 1:]
+        if edit == "replace":
+            return word[:i] + rng.choice(letters) + word[i + 1:]
+        if edit == "insert":
+            return word[:i] + rng.choice(letters) + word[i:]
+        i = min(i, len(word) - 2)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+    queries = {"prefix": [], "substring": [], "fulltext": [], "fuzzy": []}
+    while min(len(found) for found in queries.values()) < per_type:
+        name = rng.choice(names)
+        key = normalize_name(name)
+        long_words = [word for word in _WORD_RE.findall(name) if len(word) >= 5]
+        if len(queries["prefix"]) < per_type:
+            queries["prefix"].append(key[:rng.randint(1, 4)])
+        if len(queries["substring"]) < per_type and len(key) >= 6:
+            start = rng.randrange(len(key) - 3)
+            queries["substring"].append(key[start:start + rng.randint(3, 6)])
+        if long_words and len(queries["fulltext"]) < per_type:
+            queries["fulltext"].append(rng.choice(long_words).lower())
+        if long_words and len(queries["fuzzy"]) < per_type:
+            queries["fuzzy"].append(typo(rng.choice(long_words).lower()))
+    return queries
+
+
+def build_structures(catalog: MedicineCatalog, names) -> tuple:
+    """Build each structure once for timing and once under tracemalloc for its memory"""
+    built = {}
+    report = {}
+    for name in names:
+        gc.collect()
+        started = time.perf_counter()
+        built[name] = BUILDS[name](catalog)
+        seconds = time.perf_counter() - started
+
+        tracemalloc.start()
+        BUILDS[name](catalog)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        entry = {"build_s": round(seconds, 4), "build_alloc_peak_mb": round(peak / 1024 / 1024, 2)}
+        if hasattr(built[name], "memory_usage"):
+            entry["memory_mb"] = round(built[name].memory_usage() / 1024 / 1024, 2)
+        report[name] = entry
+        print(f"  built {name:<15} {entry['build_s']:>8.3f}s")
+    return built, report
+
+
+def measure(search, engine, queries: list, min_time: float) -> dict:
+    """Throughput, latency and allocation figures for one strategy over one query set"""
+    results = [len(search(engine, q)) for q in queries]  # warm-up pass, also the result counts
+
+    latencies = []
+    gen0_before = gc.get_stats()[0]["collections"]
+    started = time.perf_counter()
+    while True:
+        for q in queries:
+            call_started = time.perf_counter()
+            search(engine, q)
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+    gen0_collections = gc.get_stats()[0]["collections"] - gen0_before
+
+    # One traced pass: bytes allocated at the high-water mark of each query
+    peaks = []
+    tracemalloc.start()
+    for q in queries:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        search(engine, q)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    # One untraced pass: memory blocks each query allocated that are still
+    # live on return (its result and everything the result references)
+    blocks = []
+    gc.disable()
+    try:
+        for q in queries:
+            before = sys.getallocatedblocks()
+            result = search(engine, q)
+            blocks.append(sys.getallocatedblocks() - before)
+            del result
+    finally:
+        gc.enable()
+
+    latencies.sort()
+    ops = len(latencies)
+
+    def percentile(p):
+        return latencies[min(ops, max(1, math.ceil(p / 100 * ops))) - 1] * 1e6
+
+    return {
+        "queries": len(queries),
+        "ops": ops,
+        "ops_per_sec": round(ops / elapsed, 1),
+        "latency_us": {
+            "mean": round(statistics.mean(latencies) * 1e6, 2),
+            "p50": round(percentile(50), 2),
+            "p99": round(percentile(99), 2),
+            "max": round(latencies[-1] * 1e6, 2),
+        },
+        "alloc_peak_bytes": {"mean": round(statistics.mean(peaks)), "max": max(peaks)},
+        "alloc_blocks": {"mean": round(statistics.mean(blocks), 1), "max": max(blocks)},
+        "gc_gen0_per_1k_ops": round(gen0_collections * 1000 / ops, 3),
+        "mean_results": round(statistics.mean(results), 2),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(previous: dict, current: dict):
+    """Print the ops/sec change of every strategy and query set present in both runs"""
+    print(f"\nops/sec vs {previous['meta'].get('commit') or 'previous run'}:")
+    for engine, query_sets in current["engines"].items():
+        for query_set, stats in query_sets.items():
+            old = previous.get("engines", {}).get(engine, {}).get(query_set)
+            if old is None:
+                continue
+            change = (stats["ops_per_sec"] / old["ops_per_sec"] - 1) * 100 if old["ops_per_sec"] else 0.0
+            print(f"  {engine:<17} {query_set:<10} {old['ops_per_sec']:>12.1f} -> "
+                  f"{stats['ops_per_sec']:>12.1f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search engines offline (no server or database)")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="directory of import .json files")
+    parser.add_argument("--queries", type=Path, default=Path("benchmark_queries.json"), help="benchmark query file")
+    parser.add_argument("--synthetic", type=int, default=50, help="synthetic queries per query type (0 disables)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic queries")
+    parser.add_argument("--engines", default=",".join(ENGINES),
+                        help="comma-separated strategies to run (default: all)")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="minimum seconds of timed repetitions per strategy and query set")
+    parser.add_argument("--output", type=Path, default=Path("engine_benchmark_results.json"),
+                        help="results file")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    engines = [name.strip() for name in args.engines.split(",") if name.strip()]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))} (choose from {', '.join(ENGINES)})")
+
+    print(f"Loading {args.data_dir}...")
+    started = time.perf_counter()
+    catalog = load_catalog_from_files(args.data_dir)
+    load_seconds = time.perf_counter() - started
+    print(f"  {len(catalog)} medicines in {load_seconds:.2f}s")
+
+    query_sets = {"benchmark": benchmark_queries(args.queries)}
+    if args.synthetic > 0:
+        query_sets["synthetic"] = synthetic_queries(catalog, args.synthetic, args.seed)
+
+    print("Building structures...")
+    built, builds = build_structures(catalog, dict.fromkeys(ENGINES[name][1] for name in engines))
+
+    report = {}
+    for name in engines:
+        query_type, structure, search = ENGINES[name]
+        report[name] = {}
+        for set_name, queries in query_sets.items():
+            if not queries.get(query_type):
+                continue
+            stats = measure(search, built[structure], queries[query_type], args.min_time)
+            report[name][set_name] = stats
+            print(f"  {name:<17} {set_name:<10} {stats['ops_per_sec']:>12.1f} ops/s  "
+                  f"p50 {stats['latency_us']['p50']:>10.1f}us  p99 {stats['latency_us']['p99']:>10.1f}us  "
+                  f"alloc {stats['alloc_peak_bytes']['mean']:>9} B/op "
+                  f"{stats['alloc_blocks']['mean']:>8} blocks/op")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": len(catalog),
+            "page_size": PAGE_SIZE,
+            "synthetic_per_type": args.synthetic,
+            "seed": args.seed,
+            "min_time_s": args.min_time,
+        },
+        "load": {
+            "seconds": round(load_seconds, 3),
+            "catalog_memory_mb": round(catalog.memory_usage() / 1024 / 1024, 2),
+        },
+        "builds": builds,
+        "engines": report,
+        "peak_rss_mb": peak_memory_mb(),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output} (peak RSS {results['peak_rss_mb']} MB)")
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,648 @@
+"""
+Database access for the PharmaVerse API.
+
+Connections are handed out by a process-wide pool instead of being opened per
+request, so TCP/auth setup is paid once and Postgres never sees more than
+DB_POOL_MAX connections from one worker.
+
+psycopg2 is a blocking driver, so :class:`Database` runs every query on a
+bounded thread pool sized to the connection pool. Async handlers await the
+result and the event loop keeps serving other requests while Postgres works.
+"""
+import asyncio
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger("pharmaverse.db")
+
+def connection_kwargs() -> dict:
+    """Connection parameters read from the environment (.env)"""
+    return {
+        "dbname": os.getenv("DB_NAME", "medicine_search"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "Dadapeer"),
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+    }
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class StreamLimitReached(Exception):
+    """Raised when every connection reserved for streaming is in use"""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool.
+
+    Connections are created lazily up to ``maxconn``; ``minconn`` of them are
+    opened eagerly by :meth:`open` when the database is reachable. A checkout waits at most ``timeout``
+    seconds for a free connection. Idle connections that have not been used for
+    ``healthcheck_interval`` seconds are probed with ``SELECT 1`` before being
+    handed out, and replaced if the probe fails.
+    """
+
+    def __init__(self, minconn: int = 2, maxconn: int = 10, timeout: float = 5.0,
+                 healthcheck_interval: float = 30.0, **conn_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("pool size must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []  # list of (connection, last_used) - LIFO keeps hot connections warm
+        self._in_use = set()
+        self._opening = 0
+        self._waiters = 0
+        self._closed = True
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._replaced = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def open(self):
+        """Open the pool and eagerly create up to ``minconn`` connections.
+
+        A connection failure only stops the warm-up: checkouts connect lazily,
+        so the pool starts even while the database is unreachable.
+        """
+        with self._cond:
+            self._closed = False
+        for _ in range(self.minconn):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.warning("Could not open pooled connections at startup: %s", e)
+                break
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts.
+
+        Connections still checked out are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _connect(self):
+        return psycopg2.connect(**self.conn_kwargs)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+                if len(self._in_use) + self._opening < self.maxconn:
+                    self._opening += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"no database connection available within {self.timeout}s "
+                        f"(pool max {self.maxconn})"
+                    )
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._in_use.add(conn)
+        elif not self._is_healthy(conn, last_used):
+            self._discard(conn)
+            try:
+                replacement = self._connect()
+            except Exception:
+                with self._cond:
+                    self._in_use.discard(conn)
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._in_use.discard(conn)
+                self._in_use.add(replacement)
+                self._replaced += 1
+            conn = replacement
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, ending any open transaction"""
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or conn.closed or self._closed:
+                drop = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                drop = False
+            self._cond.notify()
+        if drop:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": len(self._in_use) + len(self._idle),
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "checkouts": checkouts,
+                "checkout_timeouts": self._timeouts,
+                "connections_replaced": self._replaced,
+                "checkout_wait_avg_ms": round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_wait_max_ms": round(self._wait_max * 1000, 3),
+                "checkout_timeout_s": self.timeout,
+                "closed": self._closed,
+            }
+
+
+def create_pool() -> ConnectionPool:
+    """Build the application pool from DB_POOL_* and DB_CONNECT_TIMEOUT environment variables"""
+    return ConnectionPool(
+        minconn=int(os.getenv("DB_POOL_MIN", 2)),
+        maxconn=int(os.getenv("DB_POOL_MAX", 10)),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", 5)),
+        healthcheck_interval=float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", 30)),
+        # Bounds every new connection, so warming the pool at startup cannot
+        # hang on a host that drops packets instead of refusing them
+        connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", 5)),
+        **connection_kwargs(),
+    )
+
+
+class SlowQueryLog:
+    """Records queries slower than ``threshold_ms`` and explains a sample of them.
+
+    Every slow query is logged (SQL, parameters, duration) and kept in a ring
+    buffer of the last ``max_entries``. Slow SELECTs are then re-run under
+    ``EXPLAIN (ANALYZE, BUFFERS)`` on a separate thread and pooled connection,
+    and the plan is attached to the entry when it arrives. EXPLAIN ANALYZE
+    executes the query again, so at most one runs at a time, each statement
+    is explained at most once per ``explain_interval`` seconds, and each is
+    bounded by ``explain_timeout_ms``.
+    """
+
+    def __init__(self, pool: "ConnectionPool", threshold_ms: float = 250.0, max_entries: int = 50,
+                 explain: bool = True, explain_interval: float = 60.0, explain_timeout_ms: int = 5000):
+        self.pool = pool
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.explain_timeout_ms = explain_timeout_ms
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self._explained_at = {}  # sql -> monotonic time of its last EXPLAIN
+        self._explaining = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self.recorded = 0
+
+    def observe(self, sql: str, params, seconds: float, settings: dict = None):
+        """Called with every query's duration; keeps the ones over the threshold.
+
+        ``settings`` are the transaction-local settings the query ran with;
+        they are applied again before EXPLAIN so the plan matches.
+        """
+        duration_ms = seconds * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        logger.warning("Slow query (%.1f ms): %s params=%r", duration_ms, " ".join(sql.split()), params)
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "sql": sql,
+            "params": list(params) if params is not None else None,
+            "settings": settings,
+            "plan": None,
+            "plan_status": "skipped",
+        }
+        with self._lock:
+            self.recorded += 1
+            self._entries.append(entry)
+            now = time.monotonic()
+            if (self.explain and not self._explaining and is_single_select(sql)
+                    and now - self._explained_at.get(sql, float("-inf")) >= self.explain_interval):
+                self._explaining = True
+                self._explained_at[sql] = now
+                entry["plan_status"] = "pending"
+            else:
+                return
+        self._executor.submit(self._explain, entry, sql, params, settings)
+
+    def _explain(self, entry: dict, sql: str, params, settings: dict = None):
+        try:
+            with self.pool.connection() as conn:
+                apply_settings(conn, settings)
+                with conn.cursor() as cursor:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (self.explain_timeout_ms,))
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+            with self._lock:
+                entry["plan"] = plan
+                entry["plan_status"] = "captured"
+        except Exception as e:
+            logger.warning("EXPLAIN of slow query failed: %s", e)
+            with self._lock:
+                entry["plan"] = str(e)
+                entry["plan_status"] = "failed"
+        finally:
+            with self._lock:
+                self._explaining = False
+
+    def entries(self) -> list:
+        """Recorded slow queries, newest first"""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# When a task sets this to a one-element list, Database.run adds the seconds
+# each call spends waiting on the database (checkout included) to it
+query_time = contextvars.ContextVar("query_time", default=None)
+
+# When a request sets this to a dict, queries add their seconds per phase
+# ("checkout", "execute", "fetch") to it, from whichever thread runs them
+phase_times = contextvars.ContextVar("phase_times", default=None)
+_phase_lock = threading.Lock()
+
+
+def record_phase(phase: str, seconds: float):
+    """Add ``seconds`` to ``phase`` in the current request's breakdown, if any"""
+    times = phase_times.get()
+    if times is not None:
+        with _phase_lock:
+            times[phase] = times.get(phase, 0.0) + seconds
+
+
+class Database:
+    """Async facade over :class:`ConnectionPool`.
+
+    Each call checks a connection out of the pool on a worker thread, runs the
+    blocking psycopg2 work there and hands the result back to the event loop.
+
+    The pool's connections are split into budgets that together never exceed
+    it: ``max_streams`` for :meth:`stream` (which holds its connection for a
+    whole download), one for the slow-query log's EXPLAINs, and the rest for
+    everything else. The main executor has one thread per connection of its
+    budget, so a thread never sits waiting for a connection that a stream or
+    another thread holds; a stream past its budget fails at once with
+    :class:`StreamLimitReached` instead of queueing.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_workers: int = None, slow_queries: SlowQueryLog = None,
+                 max_streams: int = 2):
+        reserved = max_streams + (1 if slow_queries is not None and slow_queries.explain else 0)
+        if max_streams < 0 or reserved >= pool.maxconn:
+            raise ValueError(f"{reserved} reserved connections leave none of the pool's {pool.maxconn} "
+                             "for regular queries")
+        self.pool = pool
+        self.max_workers = max_workers or pool.maxconn - reserved
+        self.max_streams = max_streams
+        self.slow_queries = slow_queries
+        self._executor = None
+        self._stream_executor = None
+        self._streams = 0
+        self._streams_lock = threading.Lock()
+
+        # Calls waiting for an executor thread. With one thread per connection
+        # this is where load queues up, not in the pool's checkout.
+        self._queue_lock = threading.Lock()
+        self._queued = 0
+        self._dequeued = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    def open(self):
+        self.pool.open()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="db")
+        if self.max_streams:
+            self._stream_executor = ThreadPoolExecutor(max_workers=self.max_streams,
+                                                       thread_name_prefix="db-stream")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._stream_executor is not None:
+            self._stream_executor.shutdown(wait=True)
+            self._stream_executor = None
+        if self.slow_queries is not None:
+            self.slow_queries.close()
+        self.pool.close()
+
+    def _call(self, fn, args, kwargs, submitted):
+        waited = time.perf_counter() - submitted
+        with self._queue_lock:
+            self._queued -= 1
+            self._dequeued += 1
+            self._queue_wait_total += waited
+            self._queue_wait_max = max(self._queue_wait_max, waited)
+        with self.pool.connection() as conn:
+            # Checkout covers the wait for a thread as well as for a connection
+            record_phase("checkout", time.perf_counter() - submitted)
+            return fn(conn, *args, **kwargs)
+
+    def _unqueue_cancelled(self, future):
+        # A call cancelled before a thread picked it up never reaches _call
+        if future.cancelled():
+            with self._queue_lock:
+                self._queued -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(conn, *args, **kwargs)`` on a pooled connection off the event loop"""
+        if self._executor is None:
+            raise RuntimeError("database is not open")
+        started = time.perf_counter()
+        with self._queue_lock:
+            self._queued += 1
+        try:
+            # The worker thread runs in a copy of this context so record_phase
+            # reaches the caller's breakdown
+            future = self._executor.submit(contextvars.copy_context().run,
+                                           functools.partial(self._call, fn, args, kwargs, started))
+            future.add_done_callback(self._unqueue_cancelled)
+            return await asyncio.wrap_future(future)
+        finally:
+            spent = query_time.get()
+            if spent is not None:
+                spent[0] += time.perf_counter() - started
+
+    async def fetch_all(self, sql: str, params=None, settings: dict = None) -> list:
+        """Execute a query and return every row.
+
+        ``settings`` ({name: value}) are applied with ``set_config(..., true)``
+        in the same transaction first, so they last only for this query.
+        """
+        return await self.run(self._timed, _fetch_all, sql, params, settings)
+
+    async def fetch_one(self, sql: str, params=None, settings: dict = None):
+        """Execute a query and return the first row (or None)"""
+        return await self.run(self._timed, _fetch_one, sql, params, settings)
+
+    def _timed(self, conn, fetch, sql, params, settings=None):
+        # Times execute + fetch on the worker thread, so pool waits never count as slow SQL
+        apply_settings(conn, settings)
+        started = time.perf_counter()
+        result = fetch(conn, sql, params)
+        if self.slow_queries is not None:
+            self.slow_queries.observe(sql, params, time.perf_counter() - started, settings)
+        return result
+
+    async def stream(self, sql: str, params=None, batch_size: int = 1000):
+        """Yield the rows of a query in lists of at most ``batch_size``.
+
+        The query runs in a server-side (named) cursor, so only one batch is
+        held in memory at a time. The connection stays checked out until the
+        generator finishes or is closed; closing it early (e.g. the client went
+        away) cancels the statement still running on the server. At most
+        ``max_streams`` run at once; one more raises :class:`StreamLimitReached`.
+        """
+        if self._executor is None:
+            raise RuntimeError("database is not open")
+        with self._streams_lock:
+            if self._streams >= self.max_streams:
+                raise StreamLimitReached(f"all {self.max_streams} streaming connections are in use")
+            self._streams += 1
+        loop = asyncio.get_running_loop()
+        executor = self._stream_executor
+        conn = cursor = None
+        in_flight = False  # a statement may be running on the server
+        server_time = 0.0  # execute + fetches, excluding time the consumer holds a batch
+        started = time.perf_counter()
+        checkout = executor.submit(self.pool.getconn)
+        try:
+            conn = await asyncio.wrap_future(checkout)
+            record_phase("checkout", time.perf_counter() - started)
+            cursor = conn.cursor(name=f"stream_{next(_stream_ids)}")
+            cursor.itersize = batch_size
+            in_flight = True
+            started = time.perf_counter()
+            await loop.run_in_executor(executor, cursor.execute, sql, params)
+            elapsed = time.perf_counter() - started
+            record_phase("execute", elapsed)
+            server_time += elapsed
+            while True:
+                in_flight = True
+                started = time.perf_counter()
+                rows = await loop.run_in_executor(executor, cursor.fetchmany, batch_size)
+                elapsed = time.perf_counter() - started
+                record_phase("fetch", elapsed)
+                server_time += elapsed
+                in_flight = False
+                if not rows:
+                    break
+                yield rows
+            if self.slow_queries is not None:
+                self.slow_queries.observe(sql, params, server_time)
+        finally:
+            # Cleanup must not await: a cancelled request cancels every await here
+            if conn is None:
+                # Cancelled or failed checkout: return the connection if it still arrives
+                checkout.add_done_callback(self._abandon_checkout)
+            else:
+                if in_flight:
+                    try:
+                        conn.cancel()
+                    except Exception:
+                        pass
+                if self._stream_executor is not None:
+                    self._stream_executor.submit(self._close_stream, conn, cursor)
+                else:
+                    self._close_stream(conn, cursor)
+
+    def _close_stream(self, conn, cursor):
+        # Runs after any in-flight fetch has returned (psycopg2 serializes on the connection)
+        try:
+            if cursor is not None:
+                cursor.close()
+        except Exception:
+            pass
+        self.pool.putconn(conn, discard=conn.closed != 0)
+        self._release_stream()
+
+    def _abandon_checkout(self, checkout):
+        if not checkout.cancelled() and checkout.exception() is None:
+            self.pool.putconn(checkout.result())
+        self._release_stream()
+
+    def _release_stream(self):
+        with self._streams_lock:
+            self._streams -= 1
+
+    def executor_stats(self) -> dict:
+        """Snapshot of calls queued for a database thread and how long they waited"""
+        with self._queue_lock:
+            dequeued = self._dequeued
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "queue_wait_avg_ms": round(self._queue_wait_total / dequeued * 1000, 3) if dequeued else 0.0,
+                "queue_wait_max_ms": round(self._queue_wait_max * 1000, 3),
+            }
+
+    def stream_stats(self) -> dict:
+        with self._streams_lock:
+            return {"active": self._streams, "max": self.max_streams}
+
+
+_stream_ids = itertools.count()
+
+
+def apply_settings(conn, settings: dict = None):
+    """Set transaction-local configuration parameters ({name: value}) on ``conn``"""
+    if not settings:
+        return
+    with conn.cursor() as cursor:
+        for name, value in settings.items():
+            cursor.execute("SELECT set_config(%s, %s, true)", (name, str(value)))
+
+
+def is_single_select(sql: str) -> bool:
+    """True for one SELECT (or WITH ... SELECT) statement, which EXPLAIN ANALYZE may re-run"""
+    statement = sql.strip().rstrip(";")
+    return statement.upper().startswith(("SELECT", "WITH")) and ";" not in statement
+
+
+def _fetch_all(conn, sql, params):
+    with conn.cursor() as cursor:
+        _execute(cursor, sql, params)
+        started = time.perf_counter()
+        rows = cursor.fetchall()
+        record_phase("fetch", time.perf_counter() - started)
+        return rows
+
+
+def _fetch_one(conn, sql, params):
+    with conn.cursor() as cursor:
+        _execute(cursor, sql, params)
+        started = time.perf_counter()
+        row = cursor.fetchone()
+        record_phase("fetch", time.perf_counter() - started)
+        return row
+
+
+def _execute(cursor, sql, params):
+    # A client-side cursor receives the whole result here; fetch* then only
+    # converts the buffered rows to Python tuples
+    started = time.perf_counter()
+    cursor.execute(sql, params)
+    record_phase("execute", time.perf_counter() - started)
+
+
+def create_slow_query_log(pool: ConnectionPool):
+    """Build the slow-query log from SLOW_QUERY_* environment variables (None when disabled)"""
+    threshold_ms = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 250))
+    if threshold_ms <= 0:
+        return None
+    return SlowQueryLog(
+        pool,
+        threshold_ms=threshold_ms,
+        max_entries=int(os.getenv("SLOW_QUERY_MAX_ENTRIES", 50)),
+        explain=os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes", "on"),
+        explain_interval=float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 60)),
+        explain_timeout_ms=int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 5000)),
+    )
+
+
+def create_database() -> Database:
+    """Build the application's async database from DB_POOL_*, SLOW_QUERY_* and STREAM_* environment variables"""
+    pool = create_pool()
+    return Database(pool, slow_queries=create_slow_query_log(pool),
+                    max_streams=int(os.getenv("STREAM_MAX_CONCURRENT", 2)))
@@ -15,48 +15,47 @@ def run_benchmark_simple():
     print("Running benchmarks for submission.json...")
     print("=" * 50)
     
+    # Submit every query in one POST /search/batch call
+    items = [
+        {'id': query_id, 'type': query_info['type'], 'q': query_info['query'], 'limit': 500}
+        for query_id, query_info in benchmark_data['queries'].items()
+    ]
+    try:
+        response = requests.post(f"{base_url}/search/batch", json=items)
+        response.raise_for_status()
+        batch = response.json()['results']
+    except Exception as e:
+        print(f"❌ Batch request failed: {str(e)}")
+        batch = {}
+
     for query_id, query_info in benchmark_data['queries'].items():
-        query_text = query_info['query']
-        query_type = query_info['type']
-        
-        print(f"Query {query_id}: {query_type} search for '{query_text}'")
-        
-        # Construct API endpoint
-        endpoint = f"{base_url}/search/{query_type}"
-        params = {'q': query_text, 'limit': 500}
-        
-        try:
-            response = requests.get(endpoint, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                medicine_names = []
-                
-                # Extract just the medicine names
-                for result in data.get('results', []):
-                    name = result.get('name', '').strip()
-                    if name and name not in medicine_names:  # Avoid duplicates
-                        medicine_names.append(name)
-                
-                results[query_id] = medicine_names
-                print(f"  ✅ Found {len(medicine_names)} unique medicines")
-                
-                # Show first few results
-                for i, name in enumerate(medicine_names[:5]):
-                    print(f"    {i+1}. {name}")
-                if len(medicine_names) > 5:
-                    print(f"    ... and {len(medicine_names) - 5} more")
-                    
-            else:
-                print(f"  ❌ Error: HTTP {response.status_code}")
-                results[query_id] = []
-                
-        except Exception as e:
-            print(f"  ❌ Exception: {str(e)}")
+        print(f"Query {query_id}: {query_info['type']} search for '{query_info['query']}'")
+        data = batch.get(query_id, {'error': 'no response'})
+
+        if 'error' not in data:
+            medicine_names = []
+
+            # Extract just the medicine names
+            for result in data.get('results', []):
+                name = result.get('name', '').strip()
+                if name and name not in medicine_names:  # Avoid duplicates
+                    medicine_names.append(name)
+
+            results[query_id] = medicine_names
+            print(f"  ✅ Found {len(medicine_names)} unique medicines in {data['execution_time_ms']}ms")
+
+            # Show first few results
+            for i, name in enumerate(medicine_names[:5]):
+                print(f"    {i+1}. {name}")
+            if len(medicine_names) > 5:
+                print(f"    ... and {len(medicine_names) - 5} more")
+
+        else:
+            print(f"  ❌ Error: {data['error']}")
             results[query_id] = []
-        
+
         print()
-    
+
     # Generate submission.json in the required format
     submission = {
         "results": results
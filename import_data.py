@@ -1,9 +1,32 @@
+import argparse
+import hashlib
+import io
+import itertools
 import json
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import execute_values
 import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Rows sent to the database per INSERT batch
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+# Characters read from a data file at a time while parsing
+READ_CHUNK_SIZE = 1 << 20
+# How long the --swap rename waits for running queries before retrying
+SWAP_LOCK_TIMEOUT = os.getenv("IMPORT_SWAP_LOCK_TIMEOUT", "5s")
+# Where the data files (a.json ... z.json) live
+DATA_DIR = Path("DB_Dataset/DB_Dataset/data")
+
 def get_db_connection():
     return psycopg2.connect(
         dbname="medicine_search",
@@ -13,121 +36,568 @@ def get_db_connection():
         port="5432"
     )
 
-def load_json_files():
-    """Load all JSON data files from DB_Dataset/DB_Dataset/data/ into database"""
-    data_dir = Path("DB_Dataset/DB_Dataset/data")
+def bump_dataset_version(cursor, full=True):
+    """Mark the data as changed so running API workers rebuild caches and indexes.
+
+    A full reload also voids the incremental change log, which refers to the
+    replaced rows. Returns the new version.
+    """
+    cursor.execute("""
+        INSERT INTO dataset_version (id, version, full_reload_version, updated_at)
+        VALUES (TRUE, 1, CASE WHEN %s THEN 1 ELSE 0 END, CURRENT_TIMESTAMP)
+        ON CONFLICT (id) DO UPDATE
+        SET version = dataset_version.version + 1,
+            full_reload_version = CASE WHEN %s THEN dataset_version.version + 1
+                                       ELSE dataset_version.full_reload_version END,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING version
+    """, (full, full))
+    version = cursor.fetchone()[0]
+    if full:
+        cursor.execute("DELETE FROM medicine_changes")
+    return version
+
+def iter_json_records(path, chunk_size=READ_CHUNK_SIZE):
+    """Yield the records of one data file without loading the whole file.
+
+    A top-level JSON array is decoded item by item from fixed-size chunks, so
+    memory use depends on the largest record, not on the file. Other layouts
+    ({"medicines": [...]}, {"data": [...]} or a single object) are parsed whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer:
+            return
+        if buffer[0] != '[':
+            data = json.loads(buffer + f.read())
+            if isinstance(data, dict) and 'medicines' in data:
+                yield from data['medicines']
+            elif isinstance(data, dict) and 'data' in data:
+                yield from data['data']
+            else:
+                yield data  # Single medicine object
+            return
+
+        pos = 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value ending exactly at the chunk boundary may continue in the next chunk
+                complete = end < len(buffer)
+            except json.JSONDecodeError:
+                complete = False
+            if complete:
+                yield item
+                pos = end
+                continue
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if pos < len(buffer):
+                    item, end = decoder.raw_decode(buffer, pos)  # raises on a truncated file
+                    yield item
+                raise json.JSONDecodeError("Unterminated top-level array", buffer, len(buffer))
+            buffer, pos = buffer[pos:] + chunk, 0
+
+def medicine_row(medicine):
+    """Insert values for one source record, or None if it has no name"""
+    # Extract medicine data with default values
+    name = medicine.get('name', '')
+    if not name:
+        return None
+    return (
+        medicine.get('sku_id', medicine.get('id', '')),
+        name,
+        medicine.get('manufacturer_name', medicine.get('manufacturer', '')),
+        medicine.get('marketer_name', medicine.get('marketer', '')),
+        medicine.get('type', medicine.get('category', 'unknown')),
+        float(medicine.get('price', 0.0)) if medicine.get('price') else 0.0,
+        medicine.get('pack_size_label', medicine.get('pack_size', '')),
+        medicine.get('short_composition', medicine.get('composition', '')),
+    )
+
+def file_rows(path, summary):
+    """Yield insert tuples for the named records of one file.
+
+    ``summary`` collects the number of records read and the error that
+    stopped the file, if any. Rows read before an error have already been
+    yielded; load_json_files then rolls a full reload back (see there).
+    """
+    try:
+        for medicine in iter_json_records(path):
+            summary["records"] += 1
+            row = medicine_row(medicine)
+            if row is not None:  # Only add if name exists
+                yield row
+    except json.JSONDecodeError as e:
+        summary["error"] = f"Error parsing {path.name} after {summary['records']} records: {e}"
+    except Exception as e:
+        summary["error"] = f"Error processing {path.name}: {e}"
+
+def parse_file(path):
+    """Worker-process entry point: every row of one file plus its summary"""
+    summary = {"records": 0, "error": None}
+    rows = list(file_rows(path, summary))
+    return rows, summary
+
+def parsed_files(paths, workers=1):
+    """Yield ``(path, rows, summary)`` per file, in the order of ``paths``.
+
+    With one worker files are streamed in this process. Otherwise up to
+    ``workers`` files are parsed at once in a process pool; results are
+    still yielded in order, with at most ``2 * workers`` files in flight, so
+    de-duplication sees records exactly as a serial run would.
+    """
+    if workers <= 1:
+        for path in paths:
+            summary = {"records": 0, "error": None}
+            yield path, file_rows(path, summary), summary
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = iter(paths)
+        pending = deque((path, pool.submit(parse_file, path))
+                        for path in itertools.islice(paths, 2 * workers))
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(parse_file, next_path)))
+            rows, summary = future.result()
+            yield path, rows, summary
+
+MEDICINE_COLUMNS = ("sku_id, name, manufacturer_name, marketer_name, type, price, pack_size_label, "
+                    "short_composition, row_hash")
+
+# COPY text format: backslash, tab and line breaks must be escaped inside values
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def copy_value(value):
+    """One column of a COPY text-format line"""
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+def copy_rows(cursor, rows, table="medicines"):
+    """Load rows with COPY ... FROM STDIN, streamed from an in-memory text buffer"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({MEDICINE_COLUMNS}) FROM STDIN", buffer)
+
+def insert_rows(cursor, rows, table="medicines"):
+    """Load rows with multi-row INSERT statements (the pre-COPY path)"""
+    execute_values(cursor, f"INSERT INTO {table} ({MEDICINE_COLUMNS}) VALUES %s", rows, page_size=1000)
+
+LOADERS = {"copy": copy_rows, "insert": insert_rows}
+
+def row_hash(row):
+    """md5 of a normalized row; an unchanged record hashes the same on every import"""
+    return hashlib.md5("\x1f".join(copy_value(value) for value in row).encode("utf-8")).hexdigest()
+
+INCOMING_TABLE = "medicines_incoming"
+
+def create_incoming_table(cursor):
+    """Temporary table receiving this import's rows for an incremental merge"""
+    cursor.execute(f"""
+        CREATE TEMP TABLE {INCOMING_TABLE} ON COMMIT DROP AS
+        SELECT {MEDICINE_COLUMNS} FROM medicines WITH NO DATA
+    """)
+
+def apply_incremental(cursor, version, deletes=True):
+    """Merge the incoming rows into medicines, logging every change under ``version``.
+
+    New sku_ids are inserted; rows whose hash differs (or that were deleted)
+    are updated; with ``deletes``, rows missing from the import are
+    soft-deleted. Unchanged rows are not written at all. Returns
+    {change: row count}.
+    """
+    cursor.execute(f"ANALYZE {INCOMING_TABLE}")
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in MEDICINE_COLUMNS.split(", ")[1:])
+    # Without deletes the CTE still runs but can match no row
+    delete_filter = "" if deletes else "AND FALSE"
+    cursor.execute(f"""
+        WITH upserted AS (
+            INSERT INTO medicines ({MEDICINE_COLUMNS})
+            SELECT {MEDICINE_COLUMNS} FROM {INCOMING_TABLE}
+            ON CONFLICT (sku_id) DO UPDATE
+            SET {updates}, deleted_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE medicines.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+               OR medicines.deleted_at IS NOT NULL
+            RETURNING id, CASE WHEN xmax = 0 THEN 'insert' ELSE 'update' END AS change
+        ), deleted AS (
+            UPDATE medicines
+            SET deleted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE deleted_at IS NULL
+              AND NOT EXISTS (SELECT 1 FROM {INCOMING_TABLE} i WHERE i.sku_id = medicines.sku_id)
+              {delete_filter}
+            RETURNING id, 'delete' AS change
+        )
+        INSERT INTO medicine_changes (version, medicine_id, change)
+        SELECT %s, id, change FROM upserted
+        UNION ALL
+        SELECT %s, id, change FROM deleted
+    """, (version, version))
+    cursor.execute("SELECT change, COUNT(*) FROM medicine_changes WHERE version = %s GROUP BY change",
+                   (version,))
+    return dict(cursor.fetchall())
+
+STAGING_TABLE = "medicines_staging"
+# Suffix of the staging table's index names until the swap gives them the live names
+STAGING_SUFFIX = "_staging"
+
+def create_staging_table(cursor):
+    """Create an empty UNLOGGED copy of medicines with no indexes and its own id sequence"""
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    cursor.execute(f"""
+        CREATE UNLOGGED TABLE {STAGING_TABLE}
+            (LIKE medicines INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)
+    """)
+    # LIKE copies the default nextval('medicines_id_seq'); give staging its own
+    # sequence, so dropping the old table later does not take the live one with it
+    cursor.execute(f"CREATE SEQUENCE {STAGING_TABLE}_id_seq OWNED BY {STAGING_TABLE}.id")
+    cursor.execute(f"ALTER TABLE {STAGING_TABLE} ALTER COLUMN id SET DEFAULT nextval('{STAGING_TABLE}_id_seq')")
+
+def live_indexes(cursor):
+    """(index name, staging CREATE INDEX statement, constraint type or None) for every index on medicines"""
+    cursor.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), con.contype
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid
+        WHERE i.indrelid = 'medicines'::regclass
+        ORDER BY c.relname
+    """)
+    indexes = []
+    for name, definition, contype in cursor.fetchall():
+        staged = re.sub(r"^(CREATE (?:UNIQUE )?INDEX) (\S+) ON (?:ONLY )?(\S+) ",
+                        rf"\1 {name}{STAGING_SUFFIX} ON {STAGING_TABLE} ", definition)
+        indexes.append((name, staged, contype))
+    return indexes
+
+def build_index(statement):
+    """Run one CREATE INDEX on its own connection (so several can build at once)"""
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(statement)
+    finally:
+        conn.close()
+
+def build_staging_indexes(indexes, jobs):
+    """Build every live index on the staging table, ``jobs`` at a time, largest first"""
+    # GIN indexes take longest; start them first so they overlap the btrees
+    statements = sorted((statement for _, statement, _ in indexes), key=lambda s: " USING btree " in s)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        list(pool.map(build_index, statements))
+
+def swap_in_staging(conn, indexes, attempts=5):
+    """Replace medicines with the staging table in one short transaction.
+
+    Readers keep using the old table until COMMIT. The swap takes an
+    ACCESS EXCLUSIVE lock, so it gives up after SWAP_LOCK_TIMEOUT and retries
+    rather than queueing every new query behind a long-running reader.
+    """
+    cursor = conn.cursor()
+    for attempt in range(1, attempts + 1):
+        try:
+            cursor.execute("SET LOCAL lock_timeout = %s", (SWAP_LOCK_TIMEOUT,))
+            cursor.execute("ALTER TABLE medicines RENAME TO medicines_old")
+            cursor.execute("DROP TABLE medicines_old")
+            cursor.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO medicines")
+            cursor.execute(f"ALTER SEQUENCE {STAGING_TABLE}_id_seq RENAME TO medicines_id_seq")
+            for name, _, contype in indexes:
+                staged = f"{name}{STAGING_SUFFIX}"
+                if contype == "p":
+                    cursor.execute(f"ALTER TABLE medicines ADD CONSTRAINT {name} PRIMARY KEY USING INDEX {staged}")
+                elif contype == "u":
+                    cursor.execute(f"ALTER TABLE medicines ADD CONSTRAINT {name} UNIQUE USING INDEX {staged}")
+                else:
+                    cursor.execute(f"ALTER INDEX {staged} RENAME TO {name}")
+            bump_dataset_version(cursor)
+            conn.commit()
+            return
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            print(f"  Swap attempt {attempt} timed out waiting for readers, retrying...")
+    raise RuntimeError(f"Could not swap in {STAGING_TABLE} after {attempts} attempts; "
+                       f"it is left in place, re-run the import to retry")
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+def load_json_files(method="copy", workers=1, swap=False, index_jobs=4, incremental=False):
+    """Load all JSON data files from DB_Dataset/DB_Dataset/data/ into database.
+
+    Records are parsed one at a time, de-duplicated by sku_id as they arrive
+    and loaded in batches of BATCH_SIZE, all in one transaction, so peak
+    memory stays flat however large the dataset is. ``method`` is "copy"
+    (COPY FROM STDIN) or "insert" (execute_values); ``workers`` > 1 parses
+    files in that many processes.
+
+    With ``swap`` the live table is left alone while loading: rows go into an
+    UNLOGGED, index-free staging table, its indexes are built afterwards
+    (``index_jobs`` at a time), and it replaces medicines in one transaction.
+    Searches keep answering from the old data until then.
+
+    With ``incremental`` the rows are merged instead: only new, changed and
+    removed sku_ids are written (see apply_incremental), and the change set
+    is logged in medicine_changes for the API to apply.
+
+    If a data file stops on an error, a full or ``swap`` reload is rolled
+    back, leaving the previous data in place, and False is returned; an
+    incremental merge goes ahead without soft-deletes (see apply_incremental).
+    """
+    load_rows = LOADERS[method]
+    data_dir = DATA_DIR
     
     if not data_dir.exists():
         print(f"Data directory not found: {data_dir}")
-        return
+        return False
     
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Clear existing data
-    print("Clearing existing data...")
-    cursor.execute("TRUNCATE TABLE medicines RESTART IDENTITY;")
+    if incremental:
+        print("Comparing with existing data...")
+        create_incoming_table(cursor)
+        table = INCOMING_TABLE
+    elif swap:
+        print(f"Loading into staging table {STAGING_TABLE}...")
+        create_staging_table(cursor)
+        table = STAGING_TABLE
+    else:
+        # Clear existing data
+        print("Clearing existing data...")
+        cursor.execute("TRUNCATE TABLE medicines RESTART IDENTITY;")
+        table = "medicines"
     
-    all_medicines = []
+    started = time.time()
+    seen_sku_ids = set()
+    batch = []
     files_processed = 0
+    files_failed = []
+    records_read = 0
+    imported = 0
+
+    def flush():
+        nonlocal batch, imported
+        load_rows(cursor, batch, table)
+        imported += len(batch)
+        batch = []
+        elapsed = time.time() - started
+        print(f"  {imported:,} medicines {'read' if incremental else 'imported'} ({imported / elapsed:,.0f} rows/s)")
     
-    # Process all JSON files (a.json to z.json)
-    for json_file in sorted(data_dir.glob("*.json")):
+    # Process all JSON files (a.json to z.json), parsing up to `workers` at once
+    json_files = sorted(data_dir.glob("*.json"))
+    for json_file, rows, summary in parsed_files(json_files, min(workers, len(json_files))):
         print(f"Processing {json_file.name}...")
         
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if not content:  # Skip empty files
-                    print(f"  Skipping empty file: {json_file.name}")
-                    continue
-                    
-                data = json.loads(content)
-                
-                # Handle different JSON structures
-                if isinstance(data, list):
-                    medicines = data
-                elif isinstance(data, dict) and 'medicines' in data:
-                    medicines = data['medicines']
-                elif isinstance(data, dict) and 'data' in data:
-                    medicines = data['data']
-                else:
-                    medicines = [data]  # Single medicine object
-                
-                for medicine in medicines:
-                    # Extract medicine data with default values
-                    medicine_data = {
-                        'sku_id': medicine.get('sku_id', medicine.get('id', '')),
-                        'name': medicine.get('name', ''),
-                        'manufacturer_name': medicine.get('manufacturer_name', medicine.get('manufacturer', '')),
-                        'marketer_name': medicine.get('marketer_name', medicine.get('marketer', '')),
-                        'type': medicine.get('type', medicine.get('category', 'unknown')),
-                        'price': float(medicine.get('price', 0.0)) if medicine.get('price') else 0.0,
-                        'pack_size_label': medicine.get('pack_size_label', medicine.get('pack_size', '')),
-                        'short_composition': medicine.get('short_composition', medicine.get('composition', ''))
-                    }
-                    
-                    if medicine_data['name']:  # Only add if name exists
-                        all_medicines.append(medicine_data)
-                
-                files_processed += 1
-                
-        except json.JSONDecodeError as e:
-            print(f"  Error parsing {json_file.name}: {e}")
-        except Exception as e:
-            print(f"  Error processing {json_file.name}: {e}")
+        for row in rows:
+            records_read += 1
+            
+            # Remove duplicates by sku_id as records arrive
+            sku_id = row[0] or f"auto_{imported + len(batch)}"  # Generate ID if empty
+            if sku_id in seen_sku_ids:
+                continue
+            seen_sku_ids.add(sku_id)
+            row = (sku_id,) + row[1:]
+            batch.append(row + (row_hash(row),))
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        
+        if summary["error"]:
+            print(f"  {summary['error']}")
+            files_failed.append(json_file.name)
+        elif not summary["records"]:
+            print(f"  Skipping empty file: {json_file.name}")
+        else:
+            files_processed += 1
     
-    print(f"\nProcessed {files_processed} files, found {len(all_medicines)} medicines")
+    if batch:
+        flush()
     
-    if all_medicines:
-        # Remove duplicates by sku_id
-        print("Removing duplicates...")
-        seen_sku_ids = set()
-        unique_medicines = []
-        for med in all_medicines:
-            sku_id = med['sku_id'] or f"auto_{len(unique_medicines)}"  # Generate ID if empty
-            if sku_id not in seen_sku_ids:
-                seen_sku_ids.add(sku_id)
-                med['sku_id'] = sku_id
-                unique_medicines.append(med)
-        
-        print(f"Unique medicines after deduplication: {len(unique_medicines)}")
-        
-        # Insert all medicines into database
-        print("Inserting medicines into database...")
-        
-        insert_query = """
-        INSERT INTO medicines (sku_id, name, manufacturer_name, marketer_name, type, price, pack_size_label, short_composition)
-        VALUES %s
-        """
-        
-        medicine_values = [
-            (med['sku_id'], med['name'], med['manufacturer_name'], med['marketer_name'], med['type'], 
-             med['price'], med['pack_size_label'], med['short_composition'])
-            for med in unique_medicines
-        ]
-        
-        execute_values(cursor, insert_query, medicine_values, page_size=1000)
-        conn.commit()
+    print(f"\nProcessed {files_processed} files, found {records_read} medicines")
+    
+    if files_failed and not incremental:
+        # Part of a file is already loaded; committing would silently drop the rest
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        print(f"Import aborted: {', '.join(files_failed)} could not be read completely. "
+              "Nothing was changed.")
+        return False
+    
+    if imported:
+        print(f"Unique medicines after deduplication: {imported}")
+        if incremental:
+            version = bump_dataset_version(cursor, full=False)
+            # A file that stopped early is missing records, which must not read as removed
+            changes = apply_incremental(cursor, version, deletes=not files_failed)
+            changed = sum(changes.values())
+            print(f"Changes: {changes.get('insert', 0)} inserted, {changes.get('update', 0)} updated, "
+                  f"{changes.get('delete', 0)} deleted, "
+                  f"{imported - changes.get('insert', 0) - changes.get('update', 0)} unchanged")
+            if files_failed:
+                print(f"Deletes skipped: {', '.join(files_failed)} could not be read completely")
+            if changed:
+                conn.commit()
+                print(f"Dataset version {version}: {changed} rows changed")
+            else:
+                conn.rollback()  # Nothing changed: keep the version, caches stay valid
+                print("Nothing changed; dataset version left as is")
+        elif swap:
+            conn.commit()
+            loaded = time.time()
+            # Logged before indexing, so a crash after the swap cannot lose the data
+            cursor.execute(f"ALTER TABLE {STAGING_TABLE} SET LOGGED")
+            conn.commit()
+            indexes = live_indexes(cursor)
+            conn.commit()
+            print(f"Building {len(indexes)} indexes ({index_jobs} at a time)...")
+            build_staging_indexes(indexes, index_jobs)
+            indexed = time.time()
+            cursor.execute(f"ANALYZE {STAGING_TABLE}")
+            conn.commit()
+            print("Swapping in the new table...")
+            swap_in_staging(conn, indexes)
+            print(f"  load {loaded - started:.1f}s, indexes {indexed - loaded:.1f}s, "
+                  f"analyze + swap {time.time() - indexed:.1f}s")
+        else:
+            bump_dataset_version(cursor)
+            conn.commit()
+            # Fresh statistics: without them the planner guesses a near-empty
+            # table and sorts prefix matches instead of reading idx_name_key in order
+            cursor.execute("ANALYZE medicines")
+            conn.commit()
         
-        print(f"Successfully imported {len(unique_medicines)} medicine records!")
+        elapsed = time.time() - started
+        print(f"Successfully imported {imported} medicine records in {elapsed:.1f}s "
+              f"({imported / elapsed:,.0f} rows/s, {method})")
+        peak = peak_memory_mb()
+        if peak is not None:
+            print(f"Peak memory: {peak:.0f} MB")
         
         # Verify the import
-        cursor.execute("SELECT COUNT(*) FROM medicines;")
+        cursor.execute("SELECT COUNT(*) FROM medicines WHERE deleted_at IS NULL;")
         count = cursor.fetchone()[0]
         print(f"Total medicines in database: {count}")
         
         # Show a few examples
-        cursor.execute("SELECT name, manufacturer_name, type FROM medicines LIMIT 5;")
+        cursor.execute("SELECT name, manufacturer_name, type FROM medicines WHERE deleted_at IS NULL LIMIT 5;")
         examples = cursor.fetchall()
         print("\nFirst 5 medicines:")
         for i, (name, manufacturer, med_type) in enumerate(examples, 1):
             print(f"  {i}. {name} by {manufacturer} ({med_type})")
     else:
+        conn.rollback()
         print("No medicine data found to import!")
     
     cursor.close()
     conn.close()
+    return True
+
+def time_parsing(workers, repeat=3, data_dir=DATA_DIR):
+    """Best wall-clock seconds over ``repeat`` runs of the parse stage, and its row count.
+
+    Every data file is parsed with ``workers`` processes and its rows are
+    de-duplicated by sku_id as load_json_files does, but nothing is hashed or
+    loaded, so no database is needed.
+    """
+    json_files = sorted(data_dir.glob("*.json"))
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        seen_sku_ids = set()
+        unique = 0
+        for _, rows, _ in parsed_files(json_files, min(workers, len(json_files))):
+            for row in rows:
+                sku_id = row[0] or f"auto_{unique}"
+                if sku_id not in seen_sku_ids:
+                    seen_sku_ids.add(sku_id)
+                    unique += 1
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, unique
+
+def usable_cpus():
+    """CPUs this process may run on (os.cpu_count() also counts ones it is pinned away from)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def file_parse_seconds(data_dir=DATA_DIR):
+    """Serial parse time of each data file, largest first"""
+    seconds = []
+    for path in sorted(data_dir.glob("*.json")):
+        started = time.perf_counter()
+        parse_file(path)
+        seconds.append((time.perf_counter() - started, path.name))
+    return sorted(seconds, reverse=True)
+
+def benchmark_parsing(worker_counts, repeat=3):
+    """Print the parse-stage time for each worker count (import_data.py --parse-only)"""
+    if not DATA_DIR.exists():
+        print(f"Data directory not found: {DATA_DIR}")
+        return
+    cpus = usable_cpus()
+    print(f"Parse stage over {DATA_DIR} on {cpus} usable CPUs, best of {repeat} runs")
+    if max(worker_counts) > cpus:
+        print(f"Note: more workers than usable CPUs; counts above {cpus} can only show pool overhead")
+    print("| Workers | Parse stage (s) | Parse rows/s |")
+    print("|--------:|----------------:|-------------:|")
+    for workers in worker_counts:
+        elapsed, rows = time_parsing(workers, repeat)
+        print(f"| {workers} | {elapsed:.3f} | {rows / elapsed:,.0f} |")
+    # With one file per worker the largest file is the critical path
+    files = file_parse_seconds()
+    total = sum(seconds for seconds, _ in files)
+    largest, name = files[0]
+    print(f"Serial parse time per file: {total:.3f}s in total, largest {name} {largest:.3f}s; "
+          f"parallel parsing can be at most {total / largest:.1f}x faster with enough CPUs")
+
+def worker_counts(value):
+    """argparse type for "1,2,4": a list of positive worker counts"""
+    try:
+        counts = [int(part) for part in value.split(",")]
+    except ValueError:
+        counts = []
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError("expected positive integers separated by commas, e.g. 1,2,4")
+    return counts
 
 if __name__ == "__main__":
-    load_json_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import DB_Dataset JSON files into the medicines table")
+    parser.add_argument("--method", choices=sorted(LOADERS), default="copy",
+                        help="copy: COPY FROM STDIN (default); insert: multi-row INSERT fallback")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes parsing data files in parallel (default: 1 = serial, streaming)")
+    parser.add_argument("--swap", action="store_true",
+                        help="zero-downtime reload: load a staging table, index it, then swap it in")
+    parser.add_argument("--incremental", action="store_true",
+                        help="merge changes only: upsert new/changed sku_ids, soft-delete missing ones")
+    parser.add_argument("--index-jobs", type=int, default=4,
+                        help="indexes built at once on the staging table with --swap (default: 4)")
+    parser.add_argument("--parse-only", type=worker_counts, metavar="N[,N...]",
+                        help="time the parse stage with each worker count, without a database")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per worker count with --parse-only; the best is reported (default: 3)")
+    args = parser.parse_args()
+    if args.parse_only:
+        benchmark_parsing(args.parse_only, args.repeat)
+        raise SystemExit
+    if args.swap and args.incremental:
+        parser.error("--swap and --incremental are mutually exclusive")
+    ok = load_json_files(method=args.method, workers=args.workers, swap=args.swap,
+                         index_jobs=args.index_jobs, incremental=args.incremental)
+    if not ok:
+        raise SystemExit(1)
\ No newline at end of file
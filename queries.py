@@ -0,0 +1,60 @@
+"""
+SQL for the database-backed search engines.
+
+Each builder returns ``(sql, params)`` for one search in keyset order, resuming
+after the sort key ``after`` when given; callers append their own LIMIT. The
+module has no side effects on import, so setup_database.py can check the plans
+of the exact queries app.py runs without building the web app.
+"""
+from search_index import prefix_key
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input only ever matches literally"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def prefix_query(q: str, after: tuple = None) -> tuple:
+    """SQL and params for prefix matches in (name_key, id) order, after keyset ``after``"""
+    # name_key is the normalized, C-collated name: LIKE 'key%' becomes an
+    # idx_name_key range scan and ORDER BY is served by the same index.
+    # The (name_key, id) row comparison resumes that scan where the last page ended.
+    keyset = "AND (name_key, id) > (%s, %s)" if after else ""
+    return f"""
+        SELECT sku_id, name, manufacturer_name, type, price, pack_size_label, short_composition, name_key, id
+        FROM medicines
+        WHERE name_key LIKE %s AND deleted_at IS NULL {keyset}
+        ORDER BY name_key, id
+    """, (escape_like(prefix_key(q)) + "%", *(after[1:] if after else ()))
+
+
+def substring_query(q: str, after: tuple = None) -> tuple:
+    """SQL and params for substring matches in (name_key, id) order, after keyset ``after``"""
+    # Same (name_key, id) order as the in-memory engine; for common terms
+    # the planner can walk idx_name_key and stop after a page of matches.
+    keyset = "AND (name_key, id) > (%s, %s)" if after else ""
+    return f"""
+        SELECT sku_id, name, manufacturer_name, type, price, pack_size_label, short_composition, name_key, id
+        FROM medicines
+        WHERE name ILIKE '%%' || %s || '%%' AND deleted_at IS NULL {keyset}
+        ORDER BY name_key, id
+    """, (escape_like(q), *(after[1:] if after else ()))
+
+
+def fulltext_query(q: str, after: tuple = None) -> tuple:
+    """SQL and params for full-text matches in (rank DESC, name_key, id) order"""
+    # websearch_to_tsquery understands multi-word input, "quoted phrases",
+    # OR and -exclusions; the GIN index on search_vector finds the matches.
+    keyset = ""
+    params = (q,)
+    if after:
+        keyset = """AND (ts_rank_cd(search_vector, query) < %s::real
+                  OR (ts_rank_cd(search_vector, query) = %s::real AND (name_key, id) > (%s, %s)))"""
+        params += (after[0], *after)
+    return f"""
+        SELECT sku_id, name, manufacturer_name, type, price, pack_size_label, short_composition,
+               ts_rank_cd(search_vector, query) AS rank, name_key, id
+        FROM medicines, websearch_to_tsquery('english', %s) AS query
+        WHERE search_vector @@ query AND deleted_at IS NULL {keyset}
+        ORDER BY rank DESC, name_key, id
+    """, params
@@ -0,0 +1,175 @@
+"""
+Result cache for the /search/* endpoints.
+
+Entries are keyed on the dataset version as well as the query, so a reimport
+makes every older entry unreachable. The in-process backend also drops them
+as soon as the new version is seen.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+
+def _json_default(value):
+    # Prices come back from psycopg2 as Decimal; the API renders them as numbers
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def encode_results(results) -> str:
+    """Serialize a result list the way it is stored and sized in the cache"""
+    return json.dumps(results, default=_json_default, separators=(",", ":"))
+
+
+class ResultCache:
+    """In-process LRU cache bounded by approximate payload bytes, with a TTL.
+
+    The size of an entry is the length of its JSON encoding, a close proxy
+    for what it costs to hold and to send. When ``max_bytes`` is exceeded the
+    least recently used entries are evicted. Entries older than ``ttl``
+    seconds are treated as misses.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    async def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    async def set(self, key: str, value):
+        size = len(encode_results(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class RedisResultCache:
+    """Cache shared by every worker through Redis or a Redis-compatible server.
+
+    Values are stored as JSON with SETEX, so the server enforces the TTL, and
+    byte-bounded LRU eviction is left to its ``maxmemory`` /
+    ``allkeys-lru`` policy. Hit and miss counters are per worker.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, ttl: float = 300.0, prefix: str = "pharmaverse:search:"):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        self.client = redis_asyncio.from_url(url)
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key: str):
+        try:
+            raw = await self.client.get(self.prefix + key)
+        except Exception:
+            self.errors += 1
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value):
+        try:
+            await self.client.setex(self.prefix + key, max(1, int(self.ttl)), encode_results(value))
+        except Exception:
+            self.errors += 1
+
+    async def clear(self):
+        # Keys embed the dataset version, so stale entries are never read again
+        # and expire on their own; nothing to delete eagerly.
+        pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+def create_cache():
+    """Build the result cache from CACHE_* environment variables (None when disabled)"""
+    backend = os.getenv("CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("CACHE_TTL", 300))
+    if backend in ("", "none", "off"):
+        return None
+    if backend == "redis":
+        return RedisResultCache(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+    if backend == "memory":
+        return ResultCache(max_bytes=int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024)), ttl=ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
@@ -1,7 +1,8 @@
 -- PostgreSQL schema for medicine search system
+-- Every statement is idempotent, so re-running this file upgrades an existing database.
 
 -- Create medicines table
-CREATE TABLE medicines (
+CREATE TABLE IF NOT EXISTS medicines (
     id SERIAL PRIMARY KEY,
     sku_id VARCHAR(255) UNIQUE,
     name VARCHAR(500) NOT NULL,
@@ -17,22 +18,78 @@ CREATE TABLE medicines (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Search-key normalization: fold accents, lower-case, collapse whitespace.
+-- search_index.normalize_name() is the Python twin; keep the two in sync.
+CREATE OR REPLACE FUNCTION normalize_name(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$
+        SELECT btrim(regexp_replace(
+            lower(translate($1,
+                'ÀÁÂÃÄÅàáâãäåÈÉÊËèéêëÌÍÎÏìíîïÒÓÔÕÖØòóôõöøÙÚÛÜùúûüÝýÿÑñÇç',
+                'AAAAAAaaaaaaEEEEeeeeIIIIiiiiOOOOOOooooooUUUUuuuuYyyNnCc')),
+            '\s+', ' ', 'g'))
+    $$;
+
+-- Normalized name used by prefix search. COLLATE "C" lets a plain btree serve
+-- both LIKE 'key%' (as a range scan) and ORDER BY name_key.
+ALTER TABLE medicines ADD COLUMN IF NOT EXISTS name_key TEXT COLLATE "C"
+    GENERATED ALWAYS AS (normalize_name(name)) STORED;
+
+-- Weighted full-text document: name (A) ranks above short_composition (B)
+ALTER TABLE medicines ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(short_composition, '')), 'B')
+    ) STORED;
+
+-- Dataset version, bumped by import_data.py on every reload. The API polls it to
+-- know when caches and in-memory search indexes are stale.
+CREATE TABLE IF NOT EXISTS dataset_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO dataset_version (id, version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
+-- Version of the last full (truncate or swap) reload; changes logged before it are void
+ALTER TABLE dataset_version ADD COLUMN IF NOT EXISTS full_reload_version BIGINT NOT NULL DEFAULT 0;
+
+-- Incremental imports (import_data.py --incremental) compare row_hash, an md5 of
+-- the normalized source record, to skip unchanged rows, and soft-delete rows that
+-- left the source by setting deleted_at. Searches only see deleted_at IS NULL.
+ALTER TABLE medicines ADD COLUMN IF NOT EXISTS row_hash TEXT;
+ALTER TABLE medicines ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+-- Rows touched by each incremental import, so API workers can patch their
+-- in-memory indexes instead of reloading the whole table
+CREATE TABLE IF NOT EXISTS medicine_changes (
+    version BIGINT NOT NULL,
+    medicine_id INTEGER NOT NULL,
+    change VARCHAR(6) NOT NULL,
+    PRIMARY KEY (version, medicine_id)
+);
+
 -- Create indexes for different search types
 
--- Prefix search index (using btree for LIKE queries)
-CREATE INDEX idx_name_prefix ON medicines (name text_pattern_ops);
-CREATE INDEX idx_manufacturer_prefix ON medicines (manufacturer_name text_pattern_ops);
+-- Prefix search index on the normalized key; (name_key, id) also gives a stable
+-- ORDER BY straight from the index (replaces idx_name_prefix on raw name)
+DROP INDEX IF EXISTS idx_name_prefix;
+CREATE INDEX IF NOT EXISTS idx_name_key ON medicines (name_key, id);
+CREATE INDEX IF NOT EXISTS idx_manufacturer_prefix ON medicines (manufacturer_name text_pattern_ops);
 
--- Full-text search index
-CREATE INDEX idx_name_fts ON medicines USING GIN (to_tsvector('english', name));
-CREATE INDEX idx_composition_fts ON medicines USING GIN (to_tsvector('english', short_composition));
+-- Full-text search index on the stored weighted tsvector
+-- (replaces the per-column idx_name_fts / idx_composition_fts expression indexes)
+DROP INDEX IF EXISTS idx_name_fts;
+DROP INDEX IF EXISTS idx_composition_fts;
+CREATE INDEX IF NOT EXISTS idx_search_vector ON medicines USING GIN (search_vector);
 
 -- Trigram indexes for fuzzy search and substring search
 CREATE EXTENSION IF NOT EXISTS pg_trgm;
-CREATE INDEX idx_name_trgm ON medicines USING GIN (name gin_trgm_ops);
-CREATE INDEX idx_composition_trgm ON medicines USING GIN (short_composition gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_name_trgm ON medicines USING GIN (name gin_trgm_ops);
+-- GiST supports index-ordered KNN scans (ORDER BY name <-> 'query') for fuzzy search
+CREATE INDEX IF NOT EXISTS idx_name_trgm_knn ON medicines USING GIST (name gist_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_composition_trgm ON medicines USING GIN (short_composition gin_trgm_ops);
 
 -- Additional indexes for performance
-CREATE INDEX idx_type ON medicines (type);
-CREATE INDEX idx_available ON medicines (available);
-CREATE INDEX idx_discontinued ON medicines (is_discontinued);
+CREATE INDEX IF NOT EXISTS idx_type ON medicines (type);
+CREATE INDEX IF NOT EXISTS idx_available ON medicines (available);
+CREATE INDEX IF NOT EXISTS idx_discontinued ON medicines (is_discontinued);
@@ -0,0 +1,586 @@
+"""
+Search-key normalization and the optional in-memory search engines.
+
+The engines answer queries from a snapshot of the medicines table held in
+process memory. They are rebuilt whenever the ``dataset_version`` row changes,
+which import_data.py bumps on every reload.
+"""
+import bisect
+import copy
+import difflib
+import heapq
+import itertools
+import os
+import re
+import sys
+from array import array
+from collections import defaultdict
+
+# Accented Latin-1 letters folded to ASCII. Must stay identical to the
+# translate() call in the normalize_name() SQL function in schema.sql.
+ACCENTED = "ÀÁÂÃÄÅàáâãäåÈÉÊËèéêëÌÍÎÏìíîïÒÓÔÕÖØòóôõöøÙÚÛÜùúûüÝýÿÑñÇç"
+UNACCENTED = "AAAAAAaaaaaaEEEEeeeeIIIIiiiiOOOOOOooooooUUUUuuuuYyyNnCc"
+
+_ACCENT_TABLE = str.maketrans(ACCENTED, UNACCENTED)
+
+
+def normalize_name(text: str) -> str:
+    """Python twin of the ``normalize_name`` SQL function.
+
+    Folds accents, lower-cases and collapses runs of whitespace to a single
+    space, so "  Crocin  Advance" and "crocin advance" share one search key.
+    """
+    if not text:
+        return ""
+    return " ".join(text.translate(_ACCENT_TABLE).lower().split())
+
+
+def prefix_key(text: str) -> str:
+    """Normalized prefix to match name keys against.
+
+    Like :func:`normalize_name`, but trailing whitespace is kept as one space,
+    so "crocin " only matches names with a word after "crocin". Empty when
+    ``text`` has no visible characters.
+    """
+    key = normalize_name(text)
+    if key and text[-1].isspace():
+        key += " "
+    return key
+
+
+# Default cut-off for calculate_similarity scores when a request gives none;
+# difflib ratios run lower than pg_trgm similarity, hence not 0.3
+FUZZY_FALLBACK_THRESHOLD = float(os.getenv("FUZZY_FALLBACK_THRESHOLD", 0.1))
+
+
+def calculate_similarity(query: str, text: str) -> float:
+    """Return a similarity ratio between 0 and 1 for two strings.
+
+    Uses difflib.SequenceMatcher which is available in the stdlib. This
+    lets the fuzzy endpoint work even if the pg_trgm extension or
+    similarity() function is not available on the database.
+    """
+    try:
+        if not text:
+            return 0.0
+        return difflib.SequenceMatcher(None, query.lower(), text.lower()).ratio()
+    except Exception:
+        return 0.0
+
+
+# Columns of a catalog row, in tuple order
+CATALOG_COLUMNS = ("id", "sku_id", "name", "manufacturer_name", "type", "price",
+                   "pack_size_label", "short_composition")
+
+CATALOG_QUERY = """
+    SELECT name_key, id, sku_id, name, manufacturer_name, type, price,
+           pack_size_label, short_composition
+    FROM medicines
+    WHERE deleted_at IS NULL
+    ORDER BY name_key, id
+"""
+
+# Live versions of the rows an incremental import touched, in catalog order
+CHANGED_ROWS_QUERY = """
+    SELECT name_key, id, sku_id, name, manufacturer_name, type, price,
+           pack_size_label, short_composition
+    FROM medicines
+    WHERE id = ANY(%s) AND deleted_at IS NULL
+    ORDER BY name_key, id
+"""
+
+
+class MedicineCatalog:
+    """Snapshot of the medicines table kept in memory in ``(name_key, id)`` order.
+
+    ``keys[i]`` is the normalized name of ``rows[i]``; both are plain lists so
+    lookups are a bisect plus a slice. Repeated strings (manufacturers, types,
+    pack sizes) are interned and prices are stored as floats to keep the
+    per-row overhead down.
+    """
+
+    def __init__(self, keys: list, rows: list, version: int = 0):
+        self.keys = keys
+        self.rows = rows
+        self.version = version
+
+    @classmethod
+    def from_records(cls, records, version: int = 0) -> "MedicineCatalog":
+        """Build from ``(name_key, id, sku_id, name, ...)`` tuples already in key order"""
+        intern = sys.intern
+        keys = []
+        rows = []
+        for key, id_, sku_id, name, manufacturer, type_, price, pack_size, composition in records:
+            keys.append(key)
+            rows.append((
+                id_,
+                sku_id,
+                name,
+                intern(manufacturer) if manufacturer else manufacturer,
+                intern(type_) if type_ else type_,
+                float(price) if price is not None else None,
+                intern(pack_size) if pack_size else pack_size,
+                intern(composition) if composition else composition,
+            ))
+        return cls(keys, rows, version)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def with_changes(self, changed_ids: set, records, version: int) -> "MedicineCatalog":
+        """New catalog with the rows in ``changed_ids`` replaced by ``records``.
+
+        ``records`` are the current ``(name_key, id, ...)`` tuples of the changed
+        rows that still exist, in key order; ids without a record were deleted.
+        The merge is linear and needs no database access.
+        """
+        return self.merge_changes(changed_ids, records, version)[0]
+
+    def merge_changes(self, changed_ids: set, records, version: int) -> tuple:
+        """:meth:`with_changes`, also reporting where rows went: ``(catalog, moved, added)``.
+
+        ``moved[old_position]`` is the new position of a kept row, or -1 for a
+        changed or deleted one; ``added`` holds the new positions of ``records``
+        in ascending order. The engines use them to patch their postings.
+        """
+        patch = MedicineCatalog.from_records(records)
+        kept = ((key, row, position) for position, (key, row) in enumerate(zip(self.keys, self.rows))
+                if row[0] not in changed_ids)
+        new = ((key, row, -1) for key, row in zip(patch.keys, patch.rows))
+        keys = []
+        rows = []
+        moved = array("i", [-1]) * len(self.rows)
+        added = array("I")
+        for key, row, old in heapq.merge(kept, new, key=lambda item: (item[0], item[1][0])):
+            if old < 0:
+                added.append(len(rows))
+            else:
+                moved[old] = len(rows)
+            keys.append(key)
+            rows.append(row)
+        return MedicineCatalog(keys, rows, version), moved, added
+
+    def position_after(self, key: str, id_: int) -> int:
+        """First position whose ``(name_key, id)`` sorts after the given pair (keyset cursor)"""
+        position = bisect.bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key and self.rows[position][0] <= id_:
+            position += 1
+        return position
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the catalog (shared objects counted once)"""
+        seen = set()
+        total = sys.getsizeof(self.keys) + sys.getsizeof(self.rows)
+        for obj in itertools.chain(self.keys, self.rows):
+            if id(obj) not in seen:
+                seen.add(id(obj))
+                total += sys.getsizeof(obj)
+        for row in self.rows:
+            for value in row:
+                if value is not None and id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+        return total
+
+
+def load_catalog(conn) -> MedicineCatalog:
+    """Read the whole medicines table and its dataset version in one snapshot"""
+    with conn.cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cursor.execute("SELECT version FROM dataset_version")
+        row = cursor.fetchone()
+        version = row[0] if row else 0
+        cursor.execute(CATALOG_QUERY)
+        catalog = MedicineCatalog.from_records(cursor, version)
+    conn.rollback()
+    return catalog
+
+
+def load_changes(conn, since_version: int):
+    """Rows changed by incremental imports after ``since_version``.
+
+    Returns ``(version, changed_ids, records)`` for
+    :meth:`MedicineCatalog.with_changes`, or None when a full reload happened
+    since and only a complete :func:`load_catalog` will do.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cursor.execute("SELECT version, full_reload_version FROM dataset_version")
+        row = cursor.fetchone()
+        version, full_reload_version = row if row else (0, 0)
+        if full_reload_version > since_version:
+            conn.rollback()
+            return None
+        cursor.execute("SELECT DISTINCT medicine_id FROM medicine_changes WHERE version > %s AND version <= %s",
+                       (since_version, version))
+        changed_ids = [medicine_id for medicine_id, in cursor.fetchall()]
+        cursor.execute(CHANGED_ROWS_QUERY, (changed_ids,))
+        records = cursor.fetchall()
+    conn.rollback()
+    return version, set(changed_ids), records
+
+
+class PrefixIndex:
+    """Autocomplete over a :class:`MedicineCatalog` without touching the database.
+
+    The catalog keys are sorted, so every name starting with a prefix sits in
+    one contiguous run that starts at ``bisect_left(keys, prefix)``.
+    """
+
+    def __init__(self, catalog: MedicineCatalog):
+        self.catalog = catalog
+
+    def search(self, prefix: str, limit: int = 100, start: int = 0) -> list:
+        """Positions of up to ``limit`` names starting with ``prefix``, from ``start`` on"""
+        key = prefix_key(prefix)
+        if not key:
+            return []
+        keys = self.catalog.keys
+        begin = max(bisect.bisect_left(keys, key), start)
+        end = begin
+        stop = min(len(keys), begin + limit)
+        while end < stop and keys[end].startswith(key):
+            end += 1
+        return list(range(begin, end))
+
+
+def remap_postings(postings: dict, moved: array, additions: dict) -> dict:
+    """Posting lists moved to a patched catalog (see :meth:`MedicineCatalog.merge_changes`).
+
+    Kept positions are translated through ``moved``, which preserves their
+    order, and ``additions`` (term -> ascending new positions) are merged in.
+    Terms left without positions are dropped.
+    """
+    remapped = {}
+    for term, posting in postings.items():
+        positions = [position for position in map(moved.__getitem__, posting) if position >= 0]
+        extra = additions.get(term)
+        if extra:
+            positions = heapq.merge(positions, extra)
+        elif not positions:
+            continue
+        remapped[term] = array("I", positions)
+    for term, extra in additions.items():
+        if term not in postings:
+            remapped[term] = array("I", extra)
+    return remapped
+
+
+def trigrams(key: str) -> set:
+    """Distinct three-character windows of a normalized key"""
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class TrigramIndex:
+    """Substring search over a :class:`MedicineCatalog` using trigram posting lists.
+
+    Each posting list holds the catalog positions of the names containing that
+    trigram. Positions follow ``(name_key, id)`` order, so intersecting the
+    lists in ascending order yields matches already sorted. The search stops
+    as soon as ``limit`` verified matches are found, rather than collecting
+    and sorting every candidate. Queries shorter than three characters walk
+    the sorted keys directly.
+    """
+
+    def __init__(self, catalog: MedicineCatalog):
+        self.catalog = catalog
+        postings = defaultdict(lambda: array("I"))
+        for position, key in enumerate(catalog.keys):
+            for gram in trigrams(key):
+                postings[gram].append(position)
+        self.postings = dict(postings)
+
+    def with_changes(self, catalog: MedicineCatalog, moved: array, added: array) -> "TrigramIndex":
+        """This index over a catalog patched by :meth:`MedicineCatalog.merge_changes`.
+
+        Only the added names are split into trigrams; the other posting
+        entries are translated to their new positions.
+        """
+        additions = defaultdict(list)
+        for position in added:
+            for gram in trigrams(catalog.keys[position]):
+                additions[gram].append(position)
+        index = copy.copy(self)
+        index.catalog = catalog
+        index.postings = remap_postings(self.postings, moved, additions)
+        return index
+
+    def _candidates(self, key: str, start: int):
+        lists = []
+        for gram in trigrams(key):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return
+            lists.append(posting)
+        lists.sort(key=len)
+        driver, others = lists[0], lists[1:]
+        cursors = [bisect.bisect_left(posting, start) for posting in others]
+        for position in itertools.islice(driver, bisect.bisect_left(driver, start), None):
+            for i, posting in enumerate(others):
+                at = bisect.bisect_left(posting, position, cursors[i])
+                cursors[i] = at
+                if at == len(posting) or posting[at] != position:
+                    break
+            else:
+                yield position
+
+    def search(self, query: str, limit: int = 100, start: int = 0) -> list:
+        """Positions of up to ``limit`` names containing ``query``, from ``start`` on"""
+        key = normalize_name(query)
+        keys = self.catalog.keys
+        if len(key) < 3:
+            candidates = range(start, len(keys))
+        else:
+            candidates = self._candidates(key, start)
+        results = []
+        for position in candidates:
+            if key in keys[position]:
+                results.append(position)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the posting lists"""
+        return sys.getsizeof(self.postings) + sum(
+            sys.getsizeof(gram) + sys.getsizeof(posting)
+            for gram, posting in self.postings.items()
+        )
+
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(key: str) -> list:
+    """Word tokens of a normalized key worth typo-correcting (not bare numbers)"""
+    return [token for token in _TOKEN_RE.findall(key) if len(token) >= 2 and not token.isdigit()]
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal-string-alignment distance, or ``max_distance + 1`` once it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SymSpellIndex:
+    """Typo-tolerant name search using SymSpell's symmetric delete dictionary.
+
+    Every name token is indexed under all strings reachable by deleting up to
+    ``max_distance`` characters from its first ``prefix_length`` characters.
+    A query token generates its own deletes and looks them up, so candidate
+    generation costs a fixed number of dictionary probes regardless of how
+    common the token's letters are. Candidates are then verified with a
+    bounded edit distance. The allowed distance grows with token length:
+    0 for up to 3 characters, 1 for 4-6, and ``max_distance`` beyond that.
+    """
+
+    def __init__(self, catalog: MedicineCatalog, max_distance: int = 2, prefix_length: int = 7):
+        self.catalog = catalog
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+
+        token_positions = defaultdict(lambda: array("I"))
+        for position, key in enumerate(catalog.keys):
+            for token in set(tokenize(key)):
+                token_positions[token].append(position)
+        self.token_positions = dict(token_positions)
+
+        # delete -> token, or list of tokens when several share the delete
+        deletes = {}
+        for token in self.token_positions:
+            for delete in self._deletes(token):
+                existing = deletes.get(delete)
+                if existing is None:
+                    deletes[delete] = token
+                elif isinstance(existing, str):
+                    deletes[delete] = [existing, token]
+                else:
+                    existing.append(token)
+        self.deletes = deletes
+
+    def with_changes(self, catalog: MedicineCatalog, moved: array, added: array) -> "SymSpellIndex":
+        """This index over a catalog patched by :meth:`MedicineCatalog.merge_changes`.
+
+        Token postings are translated to the new positions and deletes are
+        generated only for tokens that appear or disappear. The delete
+        dictionary is copied, never modified, because the current index may
+        still be answering queries.
+        """
+        additions = defaultdict(list)
+        for position in added:
+            for token in set(tokenize(catalog.keys[position])):
+                additions[token].append(position)
+        token_positions = remap_postings(self.token_positions, moved, additions)
+        deletes = dict(self.deletes)
+        for token in self.token_positions.keys() - token_positions.keys():
+            for delete in self._deletes(token):
+                existing = deletes[delete]
+                if isinstance(existing, str):
+                    del deletes[delete]
+                else:
+                    remaining = [other for other in existing if other != token]
+                    deletes[delete] = remaining[0] if len(remaining) == 1 else remaining
+        for token in token_positions.keys() - self.token_positions.keys():
+            for delete in self._deletes(token):
+                existing = deletes.get(delete)
+                if existing is None:
+                    deletes[delete] = token
+                elif isinstance(existing, str):
+                    deletes[delete] = [existing, token]
+                else:
+                    deletes[delete] = existing + [token]
+        index = copy.copy(self)
+        index.catalog = catalog
+        index.token_positions = token_positions
+        index.deletes = deletes
+        return index
+
+    def distance_for(self, token: str) -> int:
+        """Edit distance allowed for a token of this length"""
+        return min(self.max_distance, max(0, (len(token) - 1) // 3))
+
+    def _deletes(self, token: str) -> set:
+        distance = self.distance_for(token)
+        prefix = token[:self.prefix_length]
+        found = {prefix}
+        frontier = {prefix}
+        for _ in range(distance):
+            frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+            found |= frontier
+        return found
+
+    def lookup(self, token: str) -> dict:
+        """Map every indexed token within the allowed distance of ``token`` to its distance"""
+        distance = self.distance_for(token)
+        matches = {}
+        for delete in self._deletes(token):
+            candidates = self.deletes.get(delete)
+            if candidates is None:
+                continue
+            if isinstance(candidates, str):
+                candidates = (candidates,)
+            for candidate in candidates:
+                if candidate not in matches:
+                    found = edit_distance(token, candidate, distance)
+                    if found <= distance:
+                        matches[candidate] = found
+        return matches
+
+    def _single_token(self, matches: dict, limit: int, after) -> list:
+        # Exact matches first, then distance 1, ... - each level merged in name order
+        results = []
+        seen = set()
+        for distance in sorted(set(matches.values())):
+            if after is not None and distance < after[0]:
+                continue
+            start = after[1] if after is not None and distance == after[0] else 0
+            postings = [
+                itertools.islice(self.token_positions[token],
+                                 bisect.bisect_left(self.token_positions[token], start), None)
+                for token, d in matches.items() if d == distance
+            ]
+            # A name can match at a smaller distance through another of its tokens
+            for position in heapq.merge(*postings):
+                if position not in seen and self._best_distance(position, matches) == distance:
+                    seen.add(position)
+                    results.append((distance, position))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def _best_distance(self, position: int, matches: dict) -> int:
+        return min(matches.get(token, self.max_distance + 1)
+                   for token in tokenize(self.catalog.keys[position]))
+
+    def _all_tokens(self, per_token: list, limit: int, after) -> list:
+        # Every query token must match some token of the name; sum the distances
+        per_token.sort(key=lambda matches: sum(len(self.token_positions[t]) for t in matches))
+        scores = None
+        for matches in per_token:
+            best = {}
+            for token, distance in matches.items():
+                for position in self.token_positions[token]:
+                    if scores is None or position in scores:
+                        if distance < best.get(position, distance + 1):
+                            best[position] = distance
+            if scores is None:
+                scores = best
+            else:
+                scores = {position: scores[position] + distance for position, distance in best.items()}
+            if not scores:
+                return []
+        ranked = ((distance, position) for position, distance in scores.items())
+        if after is not None:
+            ranked = (pair for pair in ranked if pair >= after)
+        return heapq.nsmallest(limit, ranked)
+
+    def search(self, query: str, limit: int = 100, after: tuple = None) -> list:
+        """Up to ``limit`` ``(edit_distance, position)`` pairs, closest first then by name.
+
+        ``after`` is an inclusive ``(edit_distance, position)`` lower bound used
+        to continue from a previous page.
+        """
+        tokens = tokenize(normalize_name(query))
+        if not tokens:
+            return []
+        per_token = []
+        for token in dict.fromkeys(tokens):
+            matches = self.lookup(token)
+            if not matches:
+                return []
+            per_token.append(matches)
+        if len(per_token) == 1:
+            return self._single_token(per_token[0], limit, after)
+        return self._all_tokens(per_token, limit, after)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the token postings and delete dictionary"""
+        total = sys.getsizeof(self.token_positions) + sys.getsizeof(self.deletes)
+        total += sum(sys.getsizeof(t) + sys.getsizeof(p) for t, p in self.token_positions.items())
+        total += sum(sys.getsizeof(d) + (0 if isinstance(v, str) else sys.getsizeof(v))
+                     for d, v in self.deletes.items())
+        return total
+
+
+class SearchIndexes:
+    """The in-memory engines enabled for this deployment, built over one catalog"""
+
+    def __init__(self, catalog: MedicineCatalog, prefix: bool = False, substring: bool = False,
+                 fuzzy: bool = False, fuzzy_max_distance: int = 2, fuzzy_prefix_length: int = 7):
+        self.catalog = catalog
+        self.version = catalog.version
+        self.prefix = PrefixIndex(catalog) if prefix else None
+        self.substring = TrigramIndex(catalog) if substring else None
+        self.fuzzy = SymSpellIndex(catalog, fuzzy_max_distance, fuzzy_prefix_length) if fuzzy else None
+
+    def with_changes(self, changed_ids: set, records, version: int) -> "SearchIndexes":
+        """The same engines with the changed rows applied (see :func:`load_changes`).
+
+        The catalog is merged and each engine patches its postings for the
+        changed names instead of re-indexing every row.
+        """
+        catalog, moved, added = self.catalog.merge_changes(changed_ids, records, version)
+        indexes = copy.copy(self)
+        indexes.catalog = catalog
+        indexes.version = version
+        indexes.prefix = PrefixIndex(catalog) if self.prefix is not None else None
+        indexes.substring = self.substring.with_changes(catalog, moved, added) if self.substring is not None else None
+        indexes.fuzzy = self.fuzzy.with_changes(catalog, moved, added) if self.fuzzy is not None else None
+        return indexes
@@ -5,10 +5,13 @@ Database setup script for Medicine Search System
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from queries import prefix_query
+
 def create_database():
     """Create the medicine_search database if it doesn't exist"""
     print("🔧 Setting up database...")
@@ -67,10 +70,13 @@ def create_tables():
             cursor.execute(schema)
         
         conn.commit()
+        print("✅ Tables created successfully!")
+        
+        plans_ok = verify_query_plans(cursor)
+        conn.rollback()
         cursor.close()
         conn.close()
-        print("✅ Tables created successfully!")
-        return True
+        return plans_ok
         
     except psycopg2.Error as e:
         print(f"❌ Error creating tables: {e}")
@@ -79,6 +85,42 @@ def create_tables():
         print("❌ schema.sql file not found!")
         return False
 
+def prefix_search_plan(cursor, prefix='para', after=None):
+    """Return the EXPLAIN output of the /search/prefix query as a list of lines"""
+    sql, params = prefix_query(prefix, after)
+    cursor.execute("EXPLAIN " + sql + "LIMIT %s", (*params, 101))
+    return [row[0] for row in cursor.fetchall()]
+
+def prefix_plan_problems(plan):
+    """List what keeps a prefix search plan from being a sort-free idx_name_key scan"""
+    problems = []
+    if any('Seq Scan' in line for line in plan):
+        problems.append("prefix search falls back to a sequential scan")
+    if not any('idx_name_key' in line for line in plan):
+        problems.append("prefix search does not use idx_name_key")
+    if any('Sort' in line.split('(')[0] for line in plan):
+        problems.append("prefix search sorts instead of reading index order")
+    return problems
+
+def verify_query_plans(cursor):
+    """Check that prefix search is an idx_name_key range scan with no sort.
+
+    Sequential scans are disabled for the check so that it is meaningful even
+    on an empty table, where the planner would otherwise always scan.
+    """
+    print("🔎 Verifying prefix search query plan...")
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    plan = prefix_search_plan(cursor)
+    problems = prefix_plan_problems(plan)
+    if problems:
+        print("❌ Query plan check failed:")
+        for problem in problems:
+            print(f"   - {problem}")
+        print("\n".join("      " + line for line in plan))
+        return False
+    print("✅ Prefix search uses an index range scan on idx_name_key")
+    return True
+
 if __name__ == "__main__":
     print("🏥 Medicine Search System - Database Setup")
     print("=" * 50)
@@ -93,5 +135,7 @@ if __name__ == "__main__":
             print("2. Run: python app.py (to start the web server)")
         else:
             print("\n❌ Database setup failed at table creation step")
+            sys.exit(1)
     else:
-        print("\n❌ Database setup failed at database creation step")
\ No newline at end of file
+        print("\n❌ Database setup failed at database creation step")
+        sys.exit(1)
\ No newline at end of file
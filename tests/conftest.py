@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_cursor():
+    """Cursor on the configured database, rolled back afterwards; skips when no database is reachable"""
+    import psycopg2
+    from db import connection_kwargs
+
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **connection_kwargs())
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database not reachable: {e}")
+    cursor = conn.cursor()
+    try:
+        yield cursor
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
@@ -0,0 +1,26 @@
+"""The /admin routes stay hidden unless ADMIN_TOKEN is configured"""
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def client():
+    # No context manager: the lifespan (database pool, watcher) is not started
+    return TestClient(app.app)
+
+
+@pytest.mark.parametrize("method", ["get", "delete"])
+def test_hidden_without_admin_token(client, monkeypatch, method):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    assert getattr(client, method)("/admin/slow-queries", headers={"X-Admin-Token": ""}).status_code == 404
+
+
+@pytest.mark.parametrize("method", ["get", "delete"])
+def test_token_required(client, monkeypatch, method):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "secret")
+    request = getattr(client, method)
+    assert request("/admin/slow-queries").status_code == 403
+    assert request("/admin/slow-queries", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert request("/admin/slow-queries", headers={"X-Admin-Token": "secret"}).status_code == 200
@@ -0,0 +1,36 @@
+"""Memory footprint of the in-memory catalog against the figure in README.md"""
+from pathlib import Path
+
+import pytest
+
+from benchmark_engines import DATA_DIR, load_catalog_from_files
+from search_index import MedicineCatalog, normalize_name
+
+ROWS = 100_000
+# README.md: "~38 MB per 100k rows"
+DOCUMENTED_BYTES_PER_100K = 38_000_000
+DATASET = Path(__file__).resolve().parent.parent / DATA_DIR
+
+
+def scaled_records(catalog: MedicineCatalog, rows: int) -> list:
+    """``rows`` catalog records, repeating the dataset with numbered names and sku_ids"""
+    records = []
+    copy = 0
+    while len(records) < rows:
+        for id_, sku_id, name, *rest in catalog.rows[:rows - len(records)]:
+            if copy:
+                name = f"{name} {copy}"
+                sku_id = f"{sku_id}-{copy}"
+            records.append((normalize_name(name), len(records) + 1, sku_id, name, *rest))
+        copy += 1
+    records.sort(key=lambda record: (record[0], record[1]))
+    return records
+
+
+def test_memory_usage_within_documented_bound():
+    if not any(DATASET.glob("*.json")):
+        pytest.skip(f"dataset not found at {DATASET}")
+    catalog = MedicineCatalog.from_records(scaled_records(load_catalog_from_files(DATASET), ROWS))
+
+    assert len(catalog) == ROWS
+    assert catalog.memory_usage() < DOCUMENTED_BYTES_PER_100K
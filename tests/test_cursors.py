@@ -0,0 +1,40 @@
+"""Crafted pagination cursors are rejected with a 400"""
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app import decode_cursor, encode_cursor
+
+
+def raw_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize("search_type, key", [
+    ("prefix", (None, "crocin", 7)), ("substring", (None, "crocin", 7)),
+    ("fulltext", (0.25, "crocin", 7)), ("fuzzy", (1, "crocin", 7)),
+])
+def test_round_trip(search_type, key):
+    assert decode_cursor(search_type, encode_cursor(search_type, key)) == key
+
+
+@pytest.mark.parametrize("search_type, cursor", [
+    ("fuzzy", raw_cursor("fuzzy", None, "crocin", 7)),
+    ("fuzzy", raw_cursor("fuzzy", "1", "crocin", 7)),
+    ("fuzzy", raw_cursor("fuzzy", True, "crocin", 7)),
+    ("fulltext", raw_cursor("fulltext", None, "crocin", 7)),
+    ("fulltext", base64.urlsafe_b64encode(b'["fulltext", NaN, "crocin", 7]').decode()),
+    ("fuzzy", raw_cursor("fuzzy", 1, None, 7)),
+    ("fuzzy", raw_cursor("fuzzy", 1, "crocin", "7")),
+    ("fuzzy", raw_cursor("fuzzy", 1, "crocin", 7.5)),
+    ("fuzzy", raw_cursor("fuzzy", 1, "crocin")),
+    ("prefix", raw_cursor("prefix", "x", "crocin", 7)),
+    ("prefix", raw_cursor("fuzzy", 1, "crocin", 7)),
+    ("prefix", "not base64!"),
+])
+def test_invalid_cursor(search_type, cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(search_type, cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,63 @@
+"""In-memory engines patched by an incremental import match a full rebuild"""
+import random
+
+import pytest
+
+from search_index import MedicineCatalog, SearchIndexes, normalize_name
+
+NAMES = [
+    "Humira 40mg Injection", "Humalog Mix 25 Kwikpen", "Huminsulin R 40IU/ml Injection",
+    "Hervycta 150 Injection", "Hepamerz Granules", "Histafree 120 Tablet", "Hexigel Gum Paint",
+    "Hydroquinone Cream", "Hylasoft Eye Drop", "Hucog 5000 HP Injection", "Herbolax Tablet",
+]
+
+
+def record(id_: int, name: str) -> tuple:
+    return (normalize_name(name), id_, f"sku{id_}", name, "Acme Ltd", "allopathy", 10.0 + id_, "strip of 10", None)
+
+
+def catalog_of(records, version: int = 0) -> MedicineCatalog:
+    return MedicineCatalog.from_records(sorted(records, key=lambda r: (r[0], r[1])), version)
+
+
+def build(catalog: MedicineCatalog) -> SearchIndexes:
+    return SearchIndexes(catalog, prefix=True, substring=True, fuzzy=True)
+
+
+def delete_sets(deletes: dict) -> dict:
+    return {delete: {value} if isinstance(value, str) else set(value) for delete, value in deletes.items()}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_with_changes_matches_rebuild(seed):
+    rng = random.Random(seed)
+    rows = {id_: record(id_, f"{rng.choice(NAMES)} {rng.randint(1, 50)}") for id_ in range(1, 300)}
+    rows[300] = record(300, "Qwertazine Syrup")  # its tokens disappear with it
+    current = build(catalog_of(rows.values(), version=1))
+    before = (current.catalog.keys[:], dict(current.substring.postings), delete_sets(current.fuzzy.deletes))
+
+    changed = set(rng.sample(range(1, 300), 60)) | {300}
+    for id_ in sorted(changed)[:20] + [300]:
+        del rows[id_]  # deleted
+    for id_ in sorted(changed)[20:]:
+        rows[id_] = record(id_, f"{rng.choice(NAMES)} Neo{rng.randint(1, 9)}")  # renamed
+    for id_ in range(301, 321):
+        changed.add(id_)
+        rows[id_] = record(id_, f"Zyvanta {id_} Tablet")  # inserted, with new tokens
+    changed_records = sorted((rows[id_] for id_ in changed if id_ in rows), key=lambda r: (r[0], r[1]))
+
+    patched = current.with_changes(changed, changed_records, version=2)
+    rebuilt = build(catalog_of(rows.values(), version=2))
+
+    assert patched.version == 2
+    assert patched.catalog.keys == rebuilt.catalog.keys
+    assert patched.catalog.rows == rebuilt.catalog.rows
+    assert patched.substring.postings == rebuilt.substring.postings
+    assert patched.fuzzy.token_positions == rebuilt.fuzzy.token_positions
+    assert delete_sets(patched.fuzzy.deletes) == delete_sets(rebuilt.fuzzy.deletes)
+    for query in ("humira", "zyvanta", "hervycta neo", "hepamrez"):
+        assert patched.fuzzy.search(query) == rebuilt.fuzzy.search(query)
+        assert patched.substring.search(query) == rebuilt.substring.search(query)
+        assert patched.prefix.search(query) == rebuilt.prefix.search(query)
+    # The previous indexes keep serving requests while the patch is built
+    assert (current.catalog.keys, current.substring.postings, delete_sets(current.fuzzy.deletes)) == before
@@ -0,0 +1,89 @@
+"""Connection pool behaviour that needs no running database"""
+import asyncio
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from db import ConnectionPool, Database, phase_times
+
+UNREACHABLE = {"host": "127.0.0.1", "port": "1", "dbname": "none", "user": "none", "connect_timeout": 1}
+
+
+def test_open_tolerates_unreachable_database():
+    pool = ConnectionPool(minconn=2, maxconn=4, **UNREACHABLE)
+    pool.open()
+    try:
+        assert pool.stats()["size"] == 0
+        assert not pool.stats()["closed"]
+        with pytest.raises(Exception):
+            pool.getconn()
+    finally:
+        pool.close()
+
+
+def test_database_opens_and_reports_the_outage():
+    database = Database(ConnectionPool(minconn=2, maxconn=4, **UNREACHABLE), max_streams=1)
+    database.open()
+    try:
+        with pytest.raises(Exception):
+            asyncio.run(database.fetch_one("SELECT 1"))
+    finally:
+        database.close()
+
+
+class FakePool:
+    """Stands in for ConnectionPool: hands out dummy connections without limit"""
+    maxconn = 3
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @contextmanager
+    def connection(self):
+        yield None
+
+
+def test_executor_queue_wait_is_reported():
+    database = Database(FakePool(), max_workers=3, max_streams=0)
+    database.open()
+
+    async def saturate():
+        await asyncio.gather(*(database.run(lambda conn: time.sleep(0.1)) for _ in range(9)))
+
+    try:
+        asyncio.run(saturate())
+        stats = database.executor_stats()
+    finally:
+        database.close()
+    assert stats["queued"] == 0
+    assert stats["workers"] == 3
+    # The last three calls waited for two rounds of 100 ms
+    assert stats["queue_wait_max_ms"] >= 150
+
+
+def test_checkout_phase_includes_executor_queue_wait():
+    database = Database(FakePool(), max_workers=1, max_streams=0)
+    database.open()
+
+    async def timed_call():
+        times = {}
+        phase_times.set(times)
+        await database.run(lambda conn: None)
+        return times
+
+    async def queued_behind_slow_call():
+        slow = asyncio.ensure_future(database.run(lambda conn: time.sleep(0.1)))
+        await asyncio.sleep(0.01)
+        times = await timed_call()
+        await slow
+        return times
+
+    try:
+        times = asyncio.run(queued_behind_slow_call())
+    finally:
+        database.close()
+    assert times["checkout"] >= 0.05
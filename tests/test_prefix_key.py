@@ -0,0 +1,38 @@
+"""Prefix matching keeps a trailing space and never matches everything"""
+import pytest
+
+from queries import prefix_query
+from search_index import MedicineCatalog, PrefixIndex, normalize_name, prefix_key
+
+NAMES = ["Crocin Advance Tablet", "Crocinol 500 Tablet", "Crocin Pain Relief Tablet", "Dolo 650 Tablet"]
+
+
+@pytest.fixture
+def index():
+    records = [(normalize_name(name), id_, f"sku{id_}", name, "Acme Ltd", "allopathy", 10.0, "strip of 10", None)
+               for id_, name in enumerate(NAMES, start=1)]
+    return PrefixIndex(MedicineCatalog.from_records(sorted(records, key=lambda r: (r[0], r[1])), 1))
+
+
+def names(index, q):
+    return [index.catalog.rows[position][2] for position in index.search(q)]
+
+
+@pytest.mark.parametrize("text, key", [
+    ("Crocin", "crocin"), ("  CROCIN  ", "crocin "), ("crocin\tad", "crocin ad"), ("   ", ""), ("", ""),
+])
+def test_prefix_key(text, key):
+    assert prefix_key(text) == key
+
+
+def test_trailing_space_needs_a_following_word(index):
+    assert names(index, "crocin") == ["Crocin Advance Tablet", "Crocin Pain Relief Tablet", "Crocinol 500 Tablet"]
+    assert names(index, "crocin ") == ["Crocin Advance Tablet", "Crocin Pain Relief Tablet"]
+
+
+def test_blank_query_matches_nothing(index):
+    assert names(index, "  ") == []
+
+
+def test_sql_pattern_keeps_trailing_space():
+    assert prefix_query("Crocin ")[1] == ("crocin %",)
@@ -0,0 +1,25 @@
+"""Query plans of the SQL that app.py actually sends"""
+import pytest
+
+from setup_database import prefix_plan_problems, prefix_search_plan
+
+
+@pytest.fixture
+def plan_cursor(db_cursor):
+    db_cursor.execute("SELECT to_regclass('medicines'), to_regclass('idx_name_key')")
+    if None in db_cursor.fetchone():
+        pytest.skip("medicines schema not loaded (run setup_database.py)")
+    # Meaningful even on a small or empty table, where a scan would be cheaper
+    db_cursor.execute("SET LOCAL enable_seqscan = off")
+    return db_cursor
+
+
+@pytest.mark.parametrize("prefix", ["h", "Hu", "para", "50%_off"])
+def test_prefix_query_is_sort_free_index_scan(plan_cursor, prefix):
+    plan = prefix_search_plan(plan_cursor, prefix)
+    assert prefix_plan_problems(plan) == [], "\n".join(plan)
+
+
+def test_prefix_query_next_page_is_sort_free_index_scan(plan_cursor):
+    plan = prefix_search_plan(plan_cursor, "hu", after=("prefix", "humira 40mg injection", 1234))
+    assert prefix_plan_problems(plan) == [], "\n".join(plan)
@@ -0,0 +1,40 @@
+"""Single-flight executions that outlive every caller"""
+import asyncio
+import gc
+import logging
+
+import app
+
+
+async def fail_later():
+    await asyncio.sleep(0.02)
+    raise RuntimeError("engine failed")
+
+
+def test_detached_failure_is_logged_and_frees_its_slot(monkeypatch, caplog):
+    monkeypatch.setattr(app, "single_flight", app.SingleFlight())
+    monkeypatch.setattr(app, "hybrid_detached", {engine: set() for engine in app.HYBRID_ENGINES})
+
+    async def detach():
+        caller = asyncio.ensure_future(app.single_flight.do("k", fail_later))
+        await asyncio.sleep(0)
+        caller.cancel()
+        app.detach_search("fulltext", "k")
+        slots = len(app.hybrid_detached["fulltext"])
+        await asyncio.sleep(0.05)
+        return slots
+
+    loop = asyncio.new_event_loop()
+    unhandled = []
+    loop.set_exception_handler(lambda _, context: unhandled.append(context))
+    try:
+        with caplog.at_level(logging.WARNING, logger="pharmaverse"):
+            slots = loop.run_until_complete(detach())
+        gc.collect()  # "exception was never retrieved" is reported when the task is collected
+    finally:
+        loop.close()
+    assert slots == 1
+    assert app.hybrid_detached["fulltext"] == set()
+    assert app.single_flight.running("k") is None
+    assert "engine failed" in caplog.text
+    assert unhandled == []